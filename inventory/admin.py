@@ -1,7 +1,14 @@
 from django.contrib import admin
+from django.core.exceptions import FieldDoesNotExist
 from django.utils import timezone
 from .models import MedicineInventory, Supplier, StockAlert, DispenseHistory
 
+try:
+    DispenseHistory._meta.get_field('date')
+    _dispense_readonly_fields = ('date',)
+except FieldDoesNotExist:
+    _dispense_readonly_fields = ()
+
 @admin.register(MedicineInventory)
 class MedicineInventoryAdmin(admin.ModelAdmin):
     list_display = ['medicine_name', 'batch_no', 'quantity_in', 'quantity_out', 'balance', 'expiry_date', 'is_expired', 'created_by']
@@ -9,6 +16,9 @@ class MedicineInventoryAdmin(admin.ModelAdmin):
     search_fields = ['medicine_name', 'batch_no', 'generic_name', 'manufacturer']
     date_hierarchy = 'date'
     readonly_fields = ['created_at', 'updated_at', 'balance', 'is_expired', 'days_to_expiry']
+    list_select_related = ('created_by',)
+    list_per_page = 50
+    show_full_result_count = False
     
     fieldsets = (
         ('Basic Information', {
@@ -32,6 +42,17 @@ class MedicineInventoryAdmin(admin.ModelAdmin):
         })
     )
 
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request).select_related('created_by')
+        # Only trim columns on the changelist; the change form needs every field
+        if request.resolver_match and request.resolver_match.url_name.endswith('_changelist'):
+            queryset = queryset.only(
+                'id', 'medicine_name', 'batch_no', 'quantity_in', 'quantity_out',
+                'expiry_date', 'created_by__username'
+            )
+        # balance and is_expired in list_display read these annotations
+        return queryset.with_status()
+
 @admin.register(Supplier)
 class SupplierAdmin(admin.ModelAdmin):
     list_display = ['name', 'contact_person', 'phone', 'email', 'created_at']
@@ -48,8 +69,8 @@ class StockAlertAdmin(admin.ModelAdmin):
     actions = ['mark_acknowledged']
     
     def mark_acknowledged(self, request, queryset):
-        queryset.update(is_acknowledged=True, acknowledged_by=request.user, acknowledged_at=timezone.now())
-        self.message_user(request, f"Marked {queryset.count()} alerts as acknowledged.")
+        updated = queryset.update(is_acknowledged=True, acknowledged_by=request.user, acknowledged_at=timezone.now())
+        self.message_user(request, f"Marked {updated} alerts as acknowledged.")
     mark_acknowledged.short_description = "Mark selected alerts as acknowledged"
 
 @admin.register(DispenseHistory)
@@ -58,4 +79,4 @@ class DispenseHistoryAdmin(admin.ModelAdmin):
     list_filter = ['date', 'dosage_form']
     search_fields = ['medicine_name', 'dispensed_to', 'patient_name', 'prescription_number']
     date_hierarchy = 'date'
-    readonly_fields = ['date'] if 'date' in [f.name for f in DispenseHistory._meta.fields] else []
+    readonly_fields = _dispense_readonly_fields
@@ -1,6 +1,24 @@
+import atexit
+
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import post_migrate
 
 
 class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
+
+    def ready(self):
+        # Connect the stock cache invalidation handlers
+        from . import signals
+
+        # Table rebuilds during migrate drop the FTS triggers; put them back
+        post_migrate.connect(signals.restore_fts_triggers, sender=self)
+
+        # Production settings queue log records; start the thread that writes
+        # them to the log file in every process (WSGI workers and commands alike)
+        log_listener = getattr(settings, 'LOG_LISTENER', None)
+        if log_listener is not None:
+            log_listener.start()
+            atexit.register(log_listener.stop)
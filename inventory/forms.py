@@ -29,7 +29,6 @@ class MedicineInventoryForm(forms.ModelForm):
                 'class': 'form-control',
                 'placeholder': 'Manufacturer name'
             }),
-            'dosage_form': forms.Select(attrs={'class': 'form-select'}),
             'strength': forms.TextInput(attrs={
                 'class': 'form-control',
                 'placeholder': 'e.g., 500mg, 10ml'
@@ -85,7 +84,7 @@ class MedicineInventoryForm(forms.ModelForm):
         }
 
     # Add custom dosage form choices
-    DOSAGE_FORM_CHOICES = [
+    DOSAGE_FORM_CHOICES = (
         ('', 'Select dosage form'),
         ('tablet', 'Tablet'),
         ('capsule', 'Capsule'),
@@ -100,7 +99,7 @@ class MedicineInventoryForm(forms.ModelForm):
         ('suspension', 'Suspension'),
         ('powder', 'Powder'),
         ('other', 'Other'),
-    ]
+    )
     
     dosage_form = forms.ChoiceField(
         choices=DOSAGE_FORM_CHOICES,
@@ -112,7 +111,7 @@ class MedicineInventoryForm(forms.ModelForm):
         
         # Set today's date as default
         if not self.instance.pk:
-            self.fields['date'].initial = timezone.now().date()
+            self.fields['date'].initial = timezone.localdate()
         
         # Make certain fields required based on context
         if 'quantity_out' in self.data and int(self.data.get('quantity_out', 0)) > 0:
@@ -122,29 +121,14 @@ class MedicineInventoryForm(forms.ModelForm):
         """Validate expiry date"""
         expiry_date = self.cleaned_data.get('expiry_date')
         if expiry_date:
-            if expiry_date <= timezone.now().date():
+            today = timezone.localdate()
+            if expiry_date <= today:
                 raise ValidationError("Expiry date must be in the future.")
-            if expiry_date <= timezone.now().date() + datetime.timedelta(days=30):
+            if expiry_date <= today + datetime.timedelta(days=30):
                 # Add warning for medicines expiring within 30 days
                 pass  # We'll handle this in the view
         return expiry_date
 
-    def clean_batch_no(self):
-        """Validate batch number uniqueness for the same medicine"""
-        batch_no = self.cleaned_data.get('batch_no')
-        medicine_name = self.cleaned_data.get('medicine_name')
-        
-        if batch_no and medicine_name:
-            existing = MedicineInventory.objects.filter(
-                medicine_name=medicine_name,
-                batch_no=batch_no
-            ).exclude(pk=self.instance.pk if self.instance.pk else None)
-            
-            if existing.exists():
-                # Allow multiple entries for same batch (for stock in/out tracking)
-                pass
-        return batch_no
-
     def clean(self):
         """Cross-field validation"""
         cleaned_data = super().clean()
@@ -206,6 +190,30 @@ class QuickDispenseForm(forms.Form):
         })
     )
 
+    def lookup_inventory(self, lock=False):
+        """Return the latest inventory record for the cleaned medicine and batch, or None.
+
+        Views should use this rather than hand-rolled queries so the lookup
+        always joins created_by and loads only the fields dispensing needs.
+        With lock=True every ledger row of the batch is locked with SELECT ...
+        FOR UPDATE first, so concurrent dispenses of the same batch run one at
+        a time; this must be called inside transaction.atomic(). SQLite
+        ignores FOR UPDATE; there the IMMEDIATE transaction_mode in settings
+        takes the write lock when the atomic block begins instead.
+        """
+        if lock:
+            list(MedicineInventory.objects.select_for_update().filter(
+                medicine_name=self.cleaned_data['medicine_name'],
+                batch_no=self.cleaned_data['batch_no']
+            ).order_by('pk').values_list('pk', flat=True))
+        return MedicineInventory.objects.select_related('created_by').only(
+            'id', 'medicine_name', 'batch_no', 'dosage_form', 'quantity_in', 'quantity_out',
+            'expiry_date', 'created_by__username'
+        ).filter(
+            medicine_name=self.cleaned_data['medicine_name'],
+            batch_no=self.cleaned_data['batch_no']
+        ).first()
+
 class SupplierForm(forms.ModelForm):
     """Form for adding/editing suppliers"""
     class Meta:
@@ -6,6 +6,7 @@ Run this daily via cron job: python manage.py check_alerts
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from django.conf import settings
+from django.db.models import F
 from django.core.mail import send_mail
 from datetime import timedelta
 from inventory.models import MedicineInventory, StockAlert
@@ -32,22 +33,35 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         self.stdout.write('Starting inventory alert check...')
         
-        alerts_created = 0
-        
+        # Fetch existing alerts once instead of probing per inventory row
+        existing = set(StockAlert.objects.filter(
+            alert_type__in=['expired', 'near_expiry', 'low_stock']
+        ).values_list('medicine_name', 'alert_type'))
+        new_alerts = []
+
+        def queue_alert(medicine_name, alert_type, message):
+            """Queue an alert unless one already exists for this medicine and type"""
+            if (medicine_name, alert_type) in existing:
+                return False
+            existing.add((medicine_name, alert_type))
+            new_alerts.append(StockAlert(
+                medicine_name=medicine_name,
+                alert_type=alert_type,
+                message=message
+            ))
+            return True
+
         # Check for expired medicines
         today = timezone.now().date()
-        expired_items = MedicineInventory.objects.filter(expiry_date__lte=today)
+        expired_items = MedicineInventory.objects.filter(
+            expiry_date__lte=today
+        ).only('medicine_name', 'batch_no', 'expiry_date').iterator(chunk_size=2000)
         
         for item in expired_items:
-            alert, created = StockAlert.objects.get_or_create(
-                medicine_name=item.medicine_name,
-                alert_type='expired',
-                defaults={
-                    'message': f'{item.medicine_name} (Batch: {item.batch_no}) has expired on {item.expiry_date}'
-                }
-            )
-            if created:
-                alerts_created += 1
+            if queue_alert(
+                item.medicine_name, 'expired',
+                f'{item.medicine_name} (Batch: {item.batch_no}) has expired on {item.expiry_date}'
+            ):
                 logger.warning(f'Expired medicine alert: {item.medicine_name} (Batch: {item.batch_no})')
 
         # Check for medicines expiring soon
@@ -55,33 +69,29 @@ class Command(BaseCommand):
         expiring_items = MedicineInventory.objects.filter(
             expiry_date__gt=today,
             expiry_date__lte=expiry_threshold
-        )
+        ).only('medicine_name', 'batch_no', 'expiry_date').iterator(chunk_size=2000)
         
         for item in expiring_items:
-            alert, created = StockAlert.objects.get_or_create(
-                medicine_name=item.medicine_name,
-                alert_type='near_expiry',
-                defaults={
-                    'message': f'{item.medicine_name} (Batch: {item.batch_no}) expires in {item.days_to_expiry} days'
-                }
-            )
-            if created:
-                alerts_created += 1
+            if queue_alert(
+                item.medicine_name, 'near_expiry',
+                f'{item.medicine_name} (Batch: {item.batch_no}) expires in {(item.expiry_date - today).days} days'
+            ):
                 logger.info(f'Near expiry alert: {item.medicine_name} (Batch: {item.batch_no})')
 
-        # Check for low stock
-        for item in MedicineInventory.objects.all():
-            if item.is_low_stock:
-                alert, created = StockAlert.objects.get_or_create(
-                    medicine_name=item.medicine_name,
-                    alert_type='low_stock',
-                    defaults={
-                        'message': f'Low stock alert: {item.medicine_name} (Current balance: {item.balance()})'
-                    }
-                )
-                if created:
-                    alerts_created += 1
-                    logger.warning(f'Low stock alert: {item.medicine_name} (Balance: {item.balance()})')
+        # Check for low stock, computing each batch balance in SQL
+        low_stock_items = MedicineInventory.objects.with_balance().filter(
+            current_balance__lt=F('minimum_stock_level')
+        ).only('medicine_name', 'batch_no', 'quantity_in', 'quantity_out', 'minimum_stock_level')
+
+        for item in low_stock_items:
+            if queue_alert(
+                item.medicine_name, 'low_stock',
+                f'Low stock alert: {item.medicine_name} (Current balance: {item.current_balance})'
+            ):
+                logger.warning(f'Low stock alert: {item.medicine_name} (Balance: {item.current_balance})')
+
+        StockAlert.objects.bulk_create(new_alerts, ignore_conflicts=True, batch_size=1000)
+        alerts_created = len(new_alerts)
 
         # Send email notifications if requested
         if options['send_email'] and alerts_created > 0:
@@ -89,12 +99,10 @@ class Command(BaseCommand):
 
         # Clean old alerts if requested
         if options['clean_old_alerts']:
-            old_alerts = StockAlert.objects.filter(
+            deleted_count, _ = StockAlert.objects.filter(
                 is_acknowledged=True,
                 acknowledged_at__lte=timezone.now() - timedelta(days=30)
-            )
-            deleted_count = old_alerts.count()
-            old_alerts.delete()
+            ).delete()
             self.stdout.write(f'Cleaned up {deleted_count} old alerts')
 
         self.stdout.write(
@@ -103,19 +111,21 @@ class Command(BaseCommand):
 
     def send_alert_emails(self):
         """Send email notifications for critical alerts"""
+        display_map = dict(StockAlert.ALERT_TYPES)
         try:
-            critical_alerts = StockAlert.objects.filter(
+            # Materialise once; emptiness and count are derived from the list
+            critical_alerts = list(StockAlert.objects.filter(
                 is_acknowledged=False,
                 alert_type__in=['expired', 'low_stock']
-            )
+            ).only('alert_type', 'message'))
             
-            if not critical_alerts.exists():
+            if not critical_alerts:
                 return
 
             message_lines = ['Critical Pharmacy Inventory Alerts:', '']
             
             for alert in critical_alerts:
-                message_lines.append(f'• {alert.get_alert_type_display()}: {alert.message}')
+                message_lines.append(f'• {display_map.get(alert.alert_type, alert.alert_type)}: {alert.message}')
             
             message_lines.extend([
                 '',
@@ -131,7 +141,7 @@ class Command(BaseCommand):
                 fail_silently=False,
             )
             
-            logger.info(f'Alert email sent for {critical_alerts.count()} critical alerts')
+            logger.info(f'Alert email sent for {len(critical_alerts)} critical alerts')
             self.stdout.write('Alert email sent successfully')
             
         except Exception as e:
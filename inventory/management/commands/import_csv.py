@@ -1,10 +1,62 @@
 import csv
 import os
-from datetime import datetime, date
+import re
+from datetime import datetime, date, timedelta
+from functools import lru_cache
 from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth.models import User
 from django.db import transaction
 from inventory.models import MedicineInventory, Supplier
+from inventory.signals import bump_stats_version
+
+
+@lru_cache(maxsize=1024)
+def _parse_date(value):
+    """Parse a CSV date string, returning None if no known format matches"""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        pass
+    # fromisoformat rejects unpadded dates such as 2024-1-5, which strptime accepts
+    for fmt in ('%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+MAX_ROW_WARNINGS = 100
+
+_INT_RE = re.compile(r'[+-]?\d+')
+_FLOAT_RE = re.compile(r'[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?')
+
+
+def _to_int(value, default=0):
+    """Parse an integer cell without raising.
+
+    Accepts a leading sign and integral floats such as '5.0' from spreadsheet
+    exports. Returns default for an empty cell and None if it isn't a whole number.
+    """
+    value = (value or '').strip()
+    if not value:
+        return default
+    if _INT_RE.fullmatch(value):
+        return int(value)
+    if _FLOAT_RE.fullmatch(value):
+        number = float(value)
+        if number.is_integer():
+            return int(number)
+    return None
+
+
+def _to_float(value, default=0.0):
+    """Parse a float cell without raising, falling back to default"""
+    value = (value or '').strip()
+    return float(value) if value and _FLOAT_RE.fullmatch(value) else default
+
 
 class Command(BaseCommand):
     help = 'Import medicines from a CSV file'
@@ -22,6 +74,12 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be imported without actually importing',
         )
+        parser.add_argument(
+            '--delimiter',
+            type=str,
+            default=None,
+            help='CSV delimiter (default: auto-detect)'
+        )
 
     def handle(self, *args, **options):
         csv_file = options['csv_file']
@@ -41,116 +99,105 @@ class Command(BaseCommand):
                 raise CommandError('No users found. Please create a user first.')
 
         medicines_to_create = []
-        suppliers_to_create = []
-        existing_suppliers = set(Supplier.objects.values_list('name', flat=True))
+        # Row warnings are buffered and written once after parsing
+        row_warnings = []
+        # Supplier names referenced by the CSV, in first-seen order
+        csv_supplier_names = {}
+        # Ledger entries already stored, fetched once so re-imports skip duplicates.
+        # Rows of this file are not added: identical rows within one CSV can be
+        # genuine repeated movements (e.g. two same-day dispenses).
+        existing_keys = set(MedicineInventory.objects.values_list(
+            'medicine_name', 'batch_no', 'date', 'quantity_in', 'quantity_out'
+        ))
 
         try:
             with open(csv_file, 'r', encoding='utf-8') as file:
-                # Try to detect delimiter
-                sample = file.read(1024)
-                file.seek(0)
-                sniffer = csv.Sniffer()
-                delimiter = sniffer.sniff(sample).delimiter
+                # Try to detect delimiter unless one was given
+                delimiter = options['delimiter']
+                if delimiter is None:
+                    sample = file.read(1024)
+                    file.seek(0)
+                    sniffer = csv.Sniffer()
+                    delimiter = sniffer.sniff(sample).delimiter
                 
-                reader = csv.DictReader(file, delimiter=delimiter)
+                reader = csv.reader(file, delimiter=delimiter)
+                headers = next(reader, [])
                 
-                self.stdout.write(f"Found columns: {reader.fieldnames}")
+                self.stdout.write(f"Found columns: {headers}")
+
+                # Resolve column positions once; rows stay plain lists
+                column_index = {name: i for i, name in enumerate(headers)}
+
+                def g(row, name, default=''):
+                    i = column_index.get(name)
+                    return row[i].strip() if i is not None and i < len(row) else default
                 
                 for row_num, row in enumerate(reader, start=2):
+                    if not row:
+                        continue
                     try:
                         # Clean and validate data
-                        medicine_name = row.get('medicine_name', '').strip()
+                        medicine_name = g(row, 'medicine_name')
                         if not medicine_name:
-                            self.stdout.write(
-                                self.style.WARNING(f'Row {row_num}: Missing medicine_name, skipping')
-                            )
+                            row_warnings.append(f'Row {row_num}: Missing medicine_name, skipping')
                             continue
 
                         # Parse date
-                        date_str = row.get('date', '').strip()
-                        if date_str:
-                            try:
-                                # Try different date formats
-                                for fmt in ['%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y']:
-                                    try:
-                                        medicine_date = datetime.strptime(date_str, fmt).date()
-                                        break
-                                    except ValueError:
-                                        continue
-                                else:
-                                    medicine_date = date.today()
-                                    self.stdout.write(
-                                        self.style.WARNING(f'Row {row_num}: Invalid date format, using today')
-                                    )
-                            except:
-                                medicine_date = date.today()
-                        else:
+                        date_str = g(row, 'date')
+                        medicine_date = _parse_date(date_str)
+                        if medicine_date is None:
+                            if date_str:
+                                row_warnings.append(f'Row {row_num}: Invalid date format, using today')
                             medicine_date = date.today()
 
-                        # Parse expiry date
-                        expiry_str = row.get('expiry_date', '').strip()
-                        if expiry_str:
-                            try:
-                                for fmt in ['%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y']:
-                                    try:
-                                        expiry_date = datetime.strptime(expiry_str, fmt).date()
-                                        break
-                                    except ValueError:
-                                        continue
-                                else:
-                                    # Default to 1 year from now
-                                    from datetime import timedelta
-                                    expiry_date = date.today() + timedelta(days=365)
-                                    self.stdout.write(
-                                        self.style.WARNING(f'Row {row_num}: Invalid expiry date, using 1 year from now')
-                                    )
-                            except:
-                                from datetime import timedelta
-                                expiry_date = date.today() + timedelta(days=365)
-                        else:
-                            from datetime import timedelta
+                        # Parse expiry date, defaulting to 1 year from now
+                        expiry_str = g(row, 'expiry_date')
+                        expiry_date = _parse_date(expiry_str)
+                        if expiry_date is None:
+                            if expiry_str:
+                                row_warnings.append(f'Row {row_num}: Invalid expiry date, using 1 year from now')
                             expiry_date = date.today() + timedelta(days=365)
 
                         # Parse numeric fields
-                        try:
-                            quantity_in = int(row.get('quantity_in', 0) or 0)
-                        except ValueError:
+                        quantity_in = _to_int(g(row, 'quantity_in'))
+                        if quantity_in is None:
+                            row_warnings.append(f'Row {row_num}: Invalid quantity_in, using 0')
                             quantity_in = 0
-
-                        try:
-                            quantity_out = int(row.get('quantity_out', 0) or 0)
-                        except ValueError:
+                        quantity_out = _to_int(g(row, 'quantity_out'))
+                        if quantity_out is None:
+                            row_warnings.append(f'Row {row_num}: Invalid quantity_out, using 0')
                             quantity_out = 0
+                        unit_cost = _to_float(g(row, 'unit_cost'))
 
-                        try:
-                            unit_cost = float(row.get('unit_cost', 0) or 0)
-                        except ValueError:
-                            unit_cost = 0.0
+                        batch_no = g(row, 'batch_no') or f'BATCH_{row_num}'
+                        entry_key = (medicine_name, batch_no, medicine_date, quantity_in, quantity_out)
+                        if entry_key in existing_keys:
+                            row_warnings.append(f'Row {row_num}: Duplicate of an existing entry for {medicine_name} ({batch_no}), skipping')
+                            continue
 
                         # Handle supplier
-                        supplier_name = row.get('supplier_name', '').strip()
-                        if supplier_name and supplier_name not in existing_suppliers:
-                            suppliers_to_create.append(Supplier(name=supplier_name))
-                            existing_suppliers.add(supplier_name)
+                        supplier_name = g(row, 'supplier_name')
+                        if supplier_name:
+                            csv_supplier_names.setdefault(supplier_name, None)
 
                         # Create medicine record
                         medicine = MedicineInventory(
                             date=medicine_date,
                             medicine_name=medicine_name,
-                            dosage_form=row.get('dosage_form', '').strip() or 'Tablet',
-                            batch_no=row.get('batch_no', '').strip() or f'BATCH_{row_num}',
+                            dosage_form=g(row, 'dosage_form') or 'Tablet',
+                            batch_no=batch_no,
                             expiry_date=expiry_date,
                             quantity_in=quantity_in,
                             quantity_out=quantity_out,
-                            generic_name=row.get('generic_name', '').strip(),
-                            manufacturer=row.get('manufacturer', '').strip(),
-                            strength=row.get('strength', '').strip(),
+                            generic_name=g(row, 'generic_name'),
+                            manufacturer=g(row, 'manufacturer'),
+                            strength=g(row, 'strength'),
                             unit_cost=unit_cost,
                             supplier_name=supplier_name,
-                            storage_condition=row.get('storage_condition', ''),
-                            prescribing_doctor=row.get('prescribing_doctor', '').strip(),
-                            dispensed_to=row.get('dispensed_to', '').strip(),
-                            notes=row.get('notes', '').strip(),
+                            storage_condition=g(row, 'storage_condition'),
+                            prescribing_doctor=g(row, 'prescribing_doctor'),
+                            dispensed_to=g(row, 'dispensed_to'),
+                            notes=g(row, 'notes'),
                             created_by=user
                         )
                         medicines_to_create.append(medicine)
@@ -164,6 +211,20 @@ class Command(BaseCommand):
         except Exception as e:
             raise CommandError(f'Error reading CSV file: {str(e)}')
 
+        if row_warnings:
+            shown = row_warnings[:MAX_ROW_WARNINGS]
+            if len(row_warnings) > MAX_ROW_WARNINGS:
+                shown.append(f'... and {len(row_warnings) - MAX_ROW_WARNINGS} more warnings')
+            self.stdout.write(self.style.WARNING('\n'.join(shown)))
+
+        # Only look up the suppliers this CSV actually references
+        existing_suppliers = set(
+            Supplier.objects.filter(name__in=csv_supplier_names).values_list('name', flat=True)
+        )
+        suppliers_to_create = [
+            Supplier(name=name) for name in csv_supplier_names if name not in existing_suppliers
+        ]
+
         # Show summary
         self.stdout.write(f"\nSummary:")
         self.stdout.write(f"- {len(medicines_to_create)} medicines to import")
@@ -190,11 +251,13 @@ class Command(BaseCommand):
                 with transaction.atomic():
                     # Create suppliers first
                     if suppliers_to_create:
-                        Supplier.objects.bulk_create(suppliers_to_create, ignore_conflicts=True)
+                        Supplier.objects.bulk_create(suppliers_to_create, batch_size=500, ignore_conflicts=True)
                         self.stdout.write(f'Created {len(suppliers_to_create)} suppliers.')
 
                     # Create medicines
-                    MedicineInventory.objects.bulk_create(medicines_to_create)
+                    MedicineInventory.objects.bulk_create(medicines_to_create, batch_size=500)
+                    # bulk_create sends no post_save, so invalidate stock caches here
+                    transaction.on_commit(bump_stats_version)
                     self.stdout.write(
                         self.style.SUCCESS(f'Successfully imported {len(medicines_to_create)} medicines.')
                     )
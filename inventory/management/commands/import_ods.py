@@ -3,16 +3,133 @@ Management command to import pharmacy inventory data from ODS file
 Usage: python manage.py import_ods "Pharmacy Inventory.ods"
 """
 
+import itertools
+import multiprocessing
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from functools import lru_cache, partial
+
+import numpy as np
 import pandas as pd
+from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction
 from django.utils import timezone
 from django.contrib.auth.models import User
 from inventory.models import MedicineInventory, DispenseHistory, Supplier
-from datetime import datetime
+from inventory.signals import bump_stats_version
 import logging
 
 logger = logging.getLogger('inventory')
 
+# Accepted string date formats, tried in order
+DATE_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y', '%Y/%m/%d']
+
+# python-calamine (Rust-backed) parses ODS much faster than odfpy; fall back
+# to odf when it is not installed.
+try:
+    from python_calamine import CalamineWorkbook
+    ODS_ENGINE = 'calamine'
+except ImportError:
+    CalamineWorkbook = None
+    ODS_ENGINE = 'odf'
+
+
+# Common column name patterns, most specific term first
+COLUMN_PATTERNS = {
+    'medicine_name': ['medicine name', 'medicine', 'drug', 'medication', 'name', 'medicine_name', 'drug_name'],
+    'generic_name': ['generic', 'generic_name', 'scientific_name'],
+    'dosage_form': ['dosage/form', 'dosage', 'form', 'dosage_form', 'type'],
+    'strength': ['strength', 'dose', 'concentration'],
+    'batch_no': ['batch no.', 'batch no', 'batch', 'lot', 'batch_no', 'lot_no', 'batch_number'],
+    'expiry_date': ['expiry date', 'expiry', 'expire', 'expiration', 'exp_date', 'expiry_date'],
+    'quantity_in': ['quantity in', 'qty_in', 'quantity_in', 'stock_in', 'received', 'in'],
+    'quantity_out': ['quantity out', 'qty_out', 'quantity_out', 'stock_out', 'dispensed', 'out'],
+    'supplier_name': ['supplier name', 'supplier', 'vendor', 'supplier_name'],
+    'storage_condition': ['storage conditions', 'storage', 'condition', 'storage_condition'],
+    'unit_cost': ['cost', 'price', 'unit_cost', 'unit_price'],
+    'date': ['date', 'transaction_date', 'entry_date'],
+    'dispensed_to': ['dispensed to', 'patient', 'dispensed_to', 'customer'],
+    'dispensed_by': ['dispensed by', 'dispensed_by', 'pharmacist'],
+    'prescribing_doctor': ['doctor', 'physician', 'prescriber', 'prescribing_doctor'],
+    'manufacturer': ['manufacturer', 'company', 'mfg'],
+    'notes': ['notes', 'remarks', 'comments', 'description']
+}
+
+# Free-text model fields copied from the sheet as stripped strings
+TEXT_FIELDS = [
+    'generic_name', 'dosage_form', 'strength', 'manufacturer', 'batch_no', 'supplier_name',
+    'storage_condition', 'dispensed_to', 'prescribing_doctor', 'notes'
+]
+
+# Fields identifying a ledger entry; rows matching one already stored are
+# skipped as re-imports. Identical rows within one file are kept, since they
+# can be genuine repeated movements (e.g. two same-day dispenses).
+LEDGER_KEY_FIELDS = ('medicine_name', 'batch_no', 'date', 'quantity_in', 'quantity_out')
+
+# Values that would abort the whole bulk import, or that could not be read
+# back, are reported and their rows skipped; see Command.invalid_value.
+MAX_UNIT_COST = 10 ** 8  # DecimalField(max_digits=10, decimal_places=2)
+# Only enforced by backends other than SQLite, which stores longer strings as-is
+CHAR_FIELD_LIMITS = [
+    (field.name, field.max_length)
+    for field in MedicineInventory._meta.concrete_fields
+    if isinstance(field, models.CharField) and field.max_length
+]
+
+# One compiled alternation per field. The lookahead lets findall report a
+# match at every position, and at each position the alternation picks the
+# earliest-listed term, so the lowest rank found is the best term in the column.
+FIELD_REGEXES = {
+    field: (re.compile('(?=(%s))' % '|'.join(re.escape(term) for term in terms)),
+            {term: rank for rank, term in reversed(list(enumerate(terms)))})
+    for field, terms in COLUMN_PATTERNS.items()
+}
+
+
+@lru_cache(maxsize=32)
+def match_columns(columns):
+    """Map each field to the column matching its highest-priority term.
+
+    columns is a tuple of the sheet's header labels. Each column is scanned
+    once per field regex, recording the best (lowest) term rank seen; ties
+    go to the earliest column. Results are cached per header tuple.
+    """
+    lowered = [str(col).lower() for col in columns]
+    mapping = dict.fromkeys(COLUMN_PATTERNS)
+    for field, (regex, ranks) in FIELD_REGEXES.items():
+        best = None
+        for i, col in enumerate(lowered):
+            found = regex.findall(col)
+            if not found:
+                continue
+            rank = min(ranks[term] for term in found)
+            if best is None or rank < best[0]:
+                best = (rank, i)
+                if rank == 0:
+                    break
+        if best is not None:
+            mapping[field] = columns[best[1]]  # Use original column name
+    return mapping
+
+
+def convert_calamine_cell(value):
+    """Normalise a raw calamine cell the way pd.read_excel(engine='calamine') does.
+
+    Integral floats become ints (so batch 12345 is not read as '12345.0'),
+    plain dates become datetimes and empty cells become NaN.
+    """
+    if isinstance(value, float):
+        as_int = int(value) if np.isfinite(value) else None
+        return as_int if as_int == value else value
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day)
+    if isinstance(value, str) and value == '':
+        return np.nan
+    return value
+
 
 class Command(BaseCommand):
     help = 'Import pharmacy inventory data from ODS file'
@@ -39,6 +156,17 @@ class Command(BaseCommand):
             action='store_true',
             help='Clear existing inventory data before import'
         )
+        parser.add_argument(
+            '--all-sheets',
+            action='store_true',
+            help='Import every sheet in the file instead of only --sheet'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processes used to parse sheets in parallel with --all-sheets (default: 1)'
+        )
 
     def handle(self, *args, **options):
         file_path = options['file_path']
@@ -53,20 +181,28 @@ class Command(BaseCommand):
             if isinstance(sheet, str) and sheet.isdigit():
                 sheet = int(sheet)
             
-            df = pd.read_excel(file_path, sheet_name=sheet, engine='odf')
+            chunk_size = getattr(settings, 'IMPORT_BATCH_SIZE', 500)
+            if options['all_sheets']:
+                total_rows, chunks = self.read_all_sheet_chunks(file_path, chunk_size, options['workers'])
+            else:
+                total_rows, chunks = self.read_sheet_chunks(file_path, sheet, chunk_size)
+            first_chunk = next(chunks)
+            chunks = itertools.chain([first_chunk], chunks)
             
-            self.stdout.write(f'Found {len(df)} rows in the file')
-            self.stdout.write('Columns in the file:')
-            for i, col in enumerate(df.columns):
-                self.stdout.write(f'  {i}: {col}')
-
-            # Show first few rows for preview
-            self.stdout.write('\nFirst 5 rows:')
-            self.stdout.write(str(df.head()))
+            self.stdout.write(f'Found {total_rows} rows in the file')
+            # The column listing and row preview cost a pandas repr, so only
+            # show them when asked for (-v 2) or when previewing
+            if dry_run or options['verbosity'] >= 2:
+                self.stdout.write(f'Columns in the file ({len(first_chunk.columns)}):')
+                for i, col in enumerate(first_chunk.columns):
+                    self.stdout.write(f'  {i}: {col}')
+
+                self.stdout.write('\nFirst 3 rows:')
+                self.stdout.write(first_chunk.head(3).to_string(max_cols=10))
             
             if dry_run:
                 self.stdout.write('\n--- DRY RUN MODE - No data will be imported ---')
-                self.preview_import(df)
+                self.preview_import(first_chunk)
                 return
 
             # Get or create a default user for import
@@ -80,11 +216,12 @@ class Command(BaseCommand):
             # Clear existing data if requested
             if clear_existing:
                 self.stdout.write('Clearing existing inventory data...')
-                MedicineInventory.objects.all().delete()
-                DispenseHistory.objects.all().delete()
+                self.clear_inventory()
 
             # Import the data
-            imported_count = self.import_data(df, import_user)
+            imported_count = self.import_data(chunks, import_user)
+            # bulk_create and the raw clear send no model signals
+            bump_stats_version()
             
             self.stdout.write(
                 self.style.SUCCESS(f'Successfully imported {imported_count} records')
@@ -93,6 +230,87 @@ class Command(BaseCommand):
         except Exception as e:
             raise CommandError(f'Error importing data: {str(e)}')
 
+    def read_sheet_chunks(self, file_path, sheet, chunk_size):
+        """Return the sheet's data row count and a generator of DataFrame chunks.
+
+        With python-calamine, rows are converted to DataFrames chunk_size at a
+        time so the whole sheet is never held as one DataFrame. The generator
+        always yields at least one (possibly empty) chunk carrying the header.
+        Columns are read as object dtype so a blank cell can't turn a numeric
+        column (e.g. batch 777) into floats ('777.0') in just some chunks.
+        """
+        if CalamineWorkbook is None:
+            df = pd.read_excel(file_path, sheet_name=sheet, engine=ODS_ENGINE, dtype=object)
+            return len(df), self.slice_frame(df, chunk_size)
+
+        workbook = CalamineWorkbook.from_path(file_path)
+        if isinstance(sheet, int):
+            worksheet = workbook.get_sheet_by_index(sheet)
+        else:
+            worksheet = workbook.get_sheet_by_name(sheet)
+        return max(worksheet.height - 1, 0), self.iter_calamine_chunks(worksheet, chunk_size)
+
+    def read_all_sheet_chunks(self, file_path, chunk_size, workers=1):
+        """Return the total data row count and DataFrame chunks for every sheet.
+
+        With workers > 1 the sheets are parsed concurrently in a process pool;
+        the chunks are still yielded in sheet order so the import itself runs
+        in this process inside a single transaction.
+        """
+        with pd.ExcelFile(file_path, engine=ODS_ENGINE) as workbook:
+            sheets = workbook.sheet_names
+
+        # Spawned (not forked) workers start from a fresh interpreter, so they
+        # never inherit Django's state or open DB connections; pd.read_excel
+        # is picklable, so they never need to import Django at all
+        read_sheet = partial(pd.read_excel, file_path, engine=ODS_ENGINE, dtype=object)
+        if workers > 1 and len(sheets) > 1:
+            with ProcessPoolExecutor(
+                max_workers=min(workers, len(sheets)),
+                mp_context=multiprocessing.get_context('spawn')
+            ) as executor:
+                frames = list(executor.map(read_sheet, sheets))
+        else:
+            frames = [read_sheet(sheet) for sheet in sheets]
+
+        total_rows = sum(len(df) for df in frames)
+        chunks = itertools.chain.from_iterable(self.slice_frame(df, chunk_size) for df in frames)
+        return total_rows, chunks
+
+    def slice_frame(self, df, chunk_size):
+        """Yield chunk_size-row slices of df, at least one even when it is empty"""
+        for start in range(0, max(len(df), 1), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+
+    def iter_calamine_chunks(self, worksheet, chunk_size):
+        """Yield DataFrames of up to chunk_size rows from a calamine worksheet"""
+        rows = worksheet.iter_rows()
+        header = []
+        seen = {}
+        # Mirror pandas' handling of blank ("Unnamed: 3") and duplicate
+        # ("Name", "Name.1", ...) headers
+        for i, cell in enumerate(next(rows, [])):
+            cell = convert_calamine_cell(cell)
+            name = f'Unnamed: {i}' if cell is np.nan else str(cell)
+            if name in seen:
+                seen[name] += 1
+                name = f'{name}.{seen[name]}'
+            else:
+                seen[name] = 0
+            header.append(name)
+
+        # Index chunks by sheet row position, as slicing a full frame would
+        chunk = []
+        start = 0
+        for row in rows:
+            chunk.append([convert_calamine_cell(cell) for cell in row])
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame(chunk, columns=header, index=range(start, start + len(chunk)), dtype=object)
+                start += len(chunk)
+                chunk = []
+        if chunk or not start:
+            yield pd.DataFrame(chunk, columns=header, index=range(start, start + len(chunk)), dtype=object)
+
     def preview_import(self, df):
         """Preview what would be imported"""
         self.stdout.write('\nPreview of import mapping:')
@@ -113,61 +331,28 @@ class Command(BaseCommand):
             for field, value in sample_record.items():
                 self.stdout.write(f'  {field}: {value}')
 
+    def clear_inventory(self):
+        """Empty the inventory and dispense history tables in bulk.
+
+        Skips Django's deletion collector, which loads every row and its
+        dependents before deleting. DispenseHistory is the only model that
+        references MedicineInventory, so clearing both tables together is safe.
+        """
+        tables = [
+            connection.ops.quote_name(model._meta.db_table)
+            for model in (DispenseHistory, MedicineInventory)
+        ]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(f'TRUNCATE {", ".join(tables)}')
+            else:
+                for table in tables:
+                    cursor.execute(f'DELETE FROM {table}')
+
     def detect_columns(self, df):
         """Automatically detect column mappings"""
-        columns = [col.lower() for col in df.columns]
-        
-        mapping = {
-            'medicine_name': None,
-            'generic_name': None,
-            'dosage_form': None,
-            'strength': None,
-            'batch_no': None,
-            'expiry_date': None,
-            'quantity_in': None,
-            'quantity_out': None,
-            'supplier_name': None,
-            'storage_condition': None,
-            'unit_cost': None,
-            'date': None,
-            'dispensed_to': None,
-            'dispensed_by': None,
-            'prescribing_doctor': None,
-            'manufacturer': None,
-            'notes': None
-        }
-
-        # Common column name patterns
-        patterns = {
-            'medicine_name': ['medicine name', 'medicine', 'drug', 'medication', 'name', 'medicine_name', 'drug_name'],
-            'generic_name': ['generic', 'generic_name', 'scientific_name'],
-            'dosage_form': ['dosage/form', 'dosage', 'form', 'dosage_form', 'type'],
-            'strength': ['strength', 'dose', 'concentration'],
-            'batch_no': ['batch no.', 'batch no', 'batch', 'lot', 'batch_no', 'lot_no', 'batch_number'],
-            'expiry_date': ['expiry date', 'expiry', 'expire', 'expiration', 'exp_date', 'expiry_date'],
-            'quantity_in': ['quantity in', 'qty_in', 'quantity_in', 'stock_in', 'received', 'in'],
-            'quantity_out': ['quantity out', 'qty_out', 'quantity_out', 'stock_out', 'dispensed', 'out'],
-            'supplier_name': ['supplier name', 'supplier', 'vendor', 'supplier_name'],
-            'storage_condition': ['storage conditions', 'storage', 'condition', 'storage_condition'],
-            'unit_cost': ['cost', 'price', 'unit_cost', 'unit_price'],
-            'date': ['date', 'transaction_date', 'entry_date'],
-            'dispensed_to': ['dispensed to', 'patient', 'dispensed_to', 'customer'],
-            'dispensed_by': ['dispensed by', 'dispensed_by', 'pharmacist'],
-            'prescribing_doctor': ['doctor', 'physician', 'prescriber', 'prescribing_doctor'],
-            'manufacturer': ['manufacturer', 'company', 'mfg'],
-            'notes': ['notes', 'remarks', 'comments', 'description']
-        }
-
-        for field, search_terms in patterns.items():
-            for term in search_terms:
-                for i, col in enumerate(columns):
-                    if term in col:
-                        mapping[field] = df.columns[i]  # Use original column name
-                        break
-                if mapping[field]:
-                    break
-
-        return mapping
+        # Copy so callers can't mutate the cached mapping
+        return dict(match_columns(tuple(df.columns)))
 
     def map_row_to_medicine(self, row, column_mapping):
         """Map a pandas row to medicine inventory fields"""
@@ -185,116 +370,234 @@ class Command(BaseCommand):
 
         return data
 
-    def import_data(self, df, import_user):
-        """Import the actual data"""
-        column_mapping = self.detect_columns(df)
+    def import_data(self, chunks, import_user):
+        """Import the actual data from an iterable of DataFrame chunks"""
+        batch_size = getattr(settings, 'IMPORT_BATCH_SIZE', 500)
         imported_count = 0
+        pending_meds = []
+        skipped = Counter()
+        # Ledger entries already stored, fetched once so re-imports skip duplicates
+        existing_keys = set(MedicineInventory.objects.values_list(*LEDGER_KEY_FIELDS))
+
+        with transaction.atomic():
+            for df in chunks:
+                # Cached per header, so this only does work when the sheet changes
+                column_mapping = self.detect_columns(df)
+                # Carry only the mapped columns through row building; one
+                # column can back several fields, so de-duplicate first
+                df = df[list(dict.fromkeys(column for column in column_mapping.values() if column))]
+
+                for medicine in self.build_medicines(df, column_mapping, import_user, skipped, existing_keys):
+                    pending_meds.append(medicine)
+                    if len(pending_meds) >= batch_size:
+                        batch_count = self.flush_batch(pending_meds, import_user, batch_size)
+                        imported_count += batch_count
+                        pending_meds = []
+                        logger.info('Imported %d records (cumulative %d)', batch_count, imported_count)
+
+            if pending_meds:
+                batch_count = self.flush_batch(pending_meds, import_user, batch_size)
+                imported_count += batch_count
+                logger.info('Imported %d records (cumulative %d)', batch_count, imported_count)
+
+        if skipped:
+            summary = ', '.join(f'{reason}: {count}' for reason, count in skipped.items())
+            self.stdout.write(f'Skipped {sum(skipped.values())} rows ({summary})')
+
+        return imported_count
+
+    def build_medicines(self, df, column_mapping, import_user, skipped=None, existing_keys=None):
+        """Yield unsaved MedicineInventory records for one chunk of rows.
+
+        The chunk's index holds each row's position in its sheet and is used
+        for row numbers in messages. Skipped rows are tallied by reason
+        in the skipped Counter and logged individually at DEBUG level. Rows
+        whose ledger key is in existing_keys (the entries stored before the
+        import began) are skipped as duplicates.
+        """
+        if skipped is None:
+            skipped = Counter()
+
+        # Drop rows without a medicine name and template/example rows up front
+        name_column = column_mapping['medicine_name']
+        if name_column:
+            names = self.clean_text(df[name_column])
+        else:
+            names = pd.Series('', index=df.index)
+        no_name = (names == '').to_numpy()
+        template = (
+            names.str.startswith('e.g.')
+            | (names == 'YYYY-MM-DD')
+            | names.str.lower().str.contains('example|template', regex=True)
+        ).to_numpy() & ~no_name
+        for position in np.flatnonzero(no_name | template):
+            reason = 'No medicine name' if no_name[position] else 'Template/example data'
+            skipped[reason] += 1
+            logger.debug('Skipping row %d: %s', df.index[position] + 1, reason)
+
+        keep = ~(no_name | template)
+        row_numbers = df.index.to_numpy()[keep] + 1
+        df = df.loc[keep]
+        names = names.to_numpy()[keep]
+
+        # Text fields are stringified and stripped in one vectorised pass per column
+        blank = np.full(len(df), '', dtype=object)
+        text = {
+            field: self.clean_text(df[column_mapping[field]]).to_numpy() if column_mapping[field] else blank
+            for field in TEXT_FIELDS
+        }
+
+        # Parse both date columns in one vectorised pass each
+        dates = self.parse_dates(df[column_mapping['date']]) if column_mapping['date'] else None
+        expiry_dates = (
+            self.parse_dates(df[column_mapping['expiry_date']]) if column_mapping['expiry_date'] else None
+        )
 
-        for index, row in df.iterrows():
+        # Numeric columns are coerced in one pass each; unparseable cells become 0/None
+        quantities_in = self.parse_numbers(df[column_mapping['quantity_in']]) if column_mapping['quantity_in'] else None
+        quantities_out = (
+            self.parse_numbers(df[column_mapping['quantity_out']]) if column_mapping['quantity_out'] else None
+        )
+        unit_costs = self.parse_decimals(df[column_mapping['unit_cost']]) if column_mapping['unit_cost'] else None
+
+        # Resolved once per chunk rather than once per row
+        today = timezone.now().date()
+        user_id = import_user.pk
+
+        for i in range(len(df)):
             try:
-                data = self.map_row_to_medicine(row, column_mapping)
-                
-                # Skip rows without essential data or template data
-                if not data.get('medicine_name'):
-                    self.stdout.write(f'Skipping row {index + 1}: No medicine name')
-                    continue
-                
-                # Skip template/example rows
-                medicine_name = str(data.get('medicine_name', '')).strip()
-                if (medicine_name.startswith('e.g.') or 
-                    medicine_name == 'YYYY-MM-DD' or 
-                    'example' in medicine_name.lower() or
-                    'template' in medicine_name.lower()):
-                    self.stdout.write(f'Skipping row {index + 1}: Template/example data')
-                    continue
+                medicine_name = names[i]
 
                 # Parse dates
-                date_value = self.parse_date(data.get('date'))
-                expiry_date = self.parse_date(data.get('expiry_date'))
+                date_value = dates[i] if dates is not None else None
+                expiry_date = expiry_dates[i] if expiry_dates is not None else None
 
                 if not expiry_date:
-                    self.stdout.write(f'Skipping row {index + 1}: No valid expiry date')
+                    skipped['No valid expiry date'] += 1
+                    logger.debug('Skipping row %d: No valid expiry date', row_numbers[i])
                     continue
 
-                # Create medicine inventory record
+                # Build medicine inventory record
                 medicine = MedicineInventory(
-                    medicine_name=str(data.get('medicine_name', '')).strip(),
-                    generic_name=str(data.get('generic_name', '')).strip(),
-                    dosage_form=str(data.get('dosage_form', '')).strip(),
-                    strength=str(data.get('strength', '')).strip(),
-                    manufacturer=str(data.get('manufacturer', '')).strip(),
-                    batch_no=str(data.get('batch_no', '')).strip(),
+                    medicine_name=medicine_name,
+                    generic_name=text['generic_name'][i],
+                    dosage_form=text['dosage_form'][i],
+                    strength=text['strength'][i],
+                    manufacturer=text['manufacturer'][i],
+                    batch_no=text['batch_no'][i],
                     expiry_date=expiry_date,
-                    quantity_in=self.parse_number(data.get('quantity_in', 0)),
-                    quantity_out=self.parse_number(data.get('quantity_out', 0)),
-                    supplier_name=str(data.get('supplier_name', '')).strip(),
-                    storage_condition=str(data.get('storage_condition', '')).strip(),
-                    unit_cost=self.parse_decimal(data.get('unit_cost')),
-                    date=date_value or timezone.now().date(),
-                    dispensed_to=str(data.get('dispensed_to', '')).strip(),
-                    prescribing_doctor=str(data.get('prescribing_doctor', '')).strip(),
-                    notes=str(data.get('notes', '')).strip(),
-                    created_by=import_user
+                    quantity_in=int(quantities_in[i]) if quantities_in is not None else 0,
+                    quantity_out=int(quantities_out[i]) if quantities_out is not None else 0,
+                    supplier_name=text['supplier_name'][i],
+                    storage_condition=text['storage_condition'][i],
+                    unit_cost=unit_costs[i] if unit_costs is not None else None,
+                    date=date_value or today,
+                    dispensed_to=text['dispensed_to'][i],
+                    prescribing_doctor=text['prescribing_doctor'][i],
+                    notes=text['notes'][i],
+                    created_by_id=user_id
                 )
 
-                medicine.save()
-                imported_count += 1
-
-                # Create dispense history if quantity_out > 0
-                if medicine.quantity_out > 0 and medicine.dispensed_to:
-                    DispenseHistory.objects.create(
-                        medicine_name=medicine.medicine_name,
-                        dosage_form=medicine.dosage_form,
-                        batch_no=medicine.batch_no,
-                        dispensed_to=medicine.dispensed_to,
-                        quantity_out=medicine.quantity_out,
-                        dispensed_by=import_user,
-                        prescribing_doctor=medicine.prescribing_doctor,
-                        inventory_record=medicine
-                    )
-
-                if imported_count % 10 == 0:
-                    self.stdout.write(f'Imported {imported_count} records...')
-
             except Exception as e:
-                self.stdout.write(f'Error importing row {index + 1}: {str(e)}')
+                self.stdout.write(f'Error importing row {row_numbers[i]}: {str(e)}')
                 continue
 
-        return imported_count
+            problem = self.invalid_value(medicine)
+            if problem:
+                skipped['Invalid values'] += 1
+                self.stdout.write(self.style.WARNING(f'Skipping row {row_numbers[i]}: {problem}'))
+                continue
 
-    def parse_date(self, date_value):
-        """Parse various date formats"""
-        if pd.isna(date_value) or not date_value:
-            return None
-
-        if isinstance(date_value, datetime):
-            return date_value.date()
-
-        if isinstance(date_value, str):
-            # Try common date formats
-            formats = ['%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y', '%Y/%m/%d']
-            for fmt in formats:
-                try:
-                    return datetime.strptime(date_value.strip(), fmt).date()
-                except ValueError:
+            if existing_keys is not None:
+                entry_key = tuple(getattr(medicine, field) for field in LEDGER_KEY_FIELDS)
+                if entry_key in existing_keys:
+                    skipped['Duplicate of an existing entry'] += 1
+                    logger.debug('Skipping row %d: Duplicate of an existing entry', row_numbers[i])
                     continue
 
+            yield medicine
+
+    def invalid_value(self, medicine):
+        """Return why this record can't be stored, or None if it can.
+
+        Quantities must fit the backend's PositiveIntegerField range (negative
+        values break its CHECK constraint everywhere). unit_cost must fit
+        DecimalField(10, 2): SQLite stores a larger value but it then can't be
+        read back. CharField lengths are only checked on backends that enforce
+        max_length; SQLite keeps the full string, as the per-row import did.
+        """
+        min_quantity, max_quantity = connection.ops.integer_field_range('PositiveIntegerField')
+        for field in ('quantity_in', 'quantity_out'):
+            value = getattr(medicine, field)
+            if not min_quantity <= value <= max_quantity:
+                return f'{field} {value} is out of range'
+        if medicine.unit_cost is not None and abs(round(medicine.unit_cost, 2)) >= MAX_UNIT_COST:
+            return f'unit_cost {medicine.unit_cost} is too large'
+        if connection.vendor != 'sqlite':
+            for field, max_length in CHAR_FIELD_LIMITS:
+                if len(getattr(medicine, field)) > max_length:
+                    return f'{field} is longer than {max_length} characters'
         return None
 
-    def parse_number(self, value):
-        """Parse numeric values"""
-        if pd.isna(value) or value == '':
-            return 0
-        try:
-            return int(float(value))
-        except (ValueError, TypeError):
-            return 0
-
-    def parse_decimal(self, value):
-        """Parse decimal values"""
-        if pd.isna(value) or value == '':
-            return None
+    def flush_batch(self, medicines, import_user, batch_size):
+        """Bulk insert a batch of medicines and their dispense history"""
+        # Dispense history needs the inventory PKs returned by bulk_create
+        created = MedicineInventory.objects.bulk_create(medicines, batch_size=batch_size)
+        user_id = import_user.pk
+        pending_dispenses = [
+            DispenseHistory(
+                medicine_name=medicine.medicine_name,
+                dosage_form=medicine.dosage_form,
+                batch_no=medicine.batch_no,
+                dispensed_to=medicine.dispensed_to,
+                quantity_out=medicine.quantity_out,
+                dispensed_by_id=user_id,
+                prescribing_doctor=medicine.prescribing_doctor,
+                inventory_record_id=medicine.pk
+            )
+            for medicine in created
+            if medicine.quantity_out > 0 and medicine.dispensed_to
+        ]
+        if pending_dispenses:
+            DispenseHistory.objects.bulk_create(pending_dispenses, batch_size=batch_size)
+        return len(created)
+
+    def clean_text(self, series):
+        """Stringify and strip a column, mapping missing cells to ''"""
+        return series.where(series.notna(), '').astype(str).str.strip()
+
+    def parse_dates(self, series):
+        """Parse a whole column of dates, returning an object array of dates or None"""
+        text = series.astype(object)
         try:
-            return float(value)
-        except (ValueError, TypeError):
-            return None
\ No newline at end of file
+            stripped = text.str.strip()
+            text = stripped.where(stripped.notna(), text)
+        except AttributeError:
+            # No string cells in this column
+            pass
+
+        result = np.full(len(text), None, dtype=object)
+        missing = np.ones(len(text), dtype=bool)
+        for fmt in DATE_FORMATS:
+            if not missing.any():
+                break
+            parsed = pd.to_datetime(text[missing], format=fmt, errors='coerce')
+            ok = parsed.notna().to_numpy()
+            positions = np.flatnonzero(missing)[ok]
+            result[positions] = parsed[ok].dt.date.to_numpy()
+            missing[positions] = False
+        return result
+
+    def parse_numbers(self, series):
+        """Parse a whole column of quantities, returning an int64 array (0 when missing)"""
+        values = pd.to_numeric(series, errors='coerce').to_numpy(dtype=float, copy=True)
+        values[~np.isfinite(values)] = 0
+        # astype truncates toward zero, like int(float(value))
+        return values.astype('int64')
+
+    def parse_decimals(self, series):
+        """Parse a whole column of costs, returning an object array of floats or None"""
+        values = pd.to_numeric(series, errors='coerce').to_numpy(dtype=float, copy=True)
+        result = values.astype(object)
+        result[~np.isfinite(values)] = None
+        return result
\ No newline at end of file
@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from django.db.models import Count
 from inventory.models import MedicineInventory, Supplier
 from django.contrib.auth.models import User
 
@@ -18,7 +19,10 @@ class Command(BaseCommand):
         
         if total_medicines > 0:
             self.stdout.write(f"\n=== RECENT MEDICINE IMPORTS ===")
-            recent_medicines = MedicineInventory.objects.order_by('-created_at')[:10]
+            recent_medicines = MedicineInventory.objects.only(
+                'medicine_name', 'batch_no', 'dosage_form', 'expiry_date',
+                'quantity_in', 'quantity_out', 'supplier_name', 'created_at'
+            ).order_by('-created_at')[:10]
             
             for i, med in enumerate(recent_medicines, 1):
                 self.stdout.write(f"{i}. {med.medicine_name}")
@@ -31,7 +35,13 @@ class Command(BaseCommand):
                 self.stdout.write("")
                 
         # Show unique medicine names
-        unique_medicines = MedicineInventory.objects.values_list('medicine_name', flat=True).distinct()
-        self.stdout.write(f"=== UNIQUE MEDICINES ({len(unique_medicines)}) ===")
-        for medicine in unique_medicines:
+        # Explicit ordering replaces the default '-date' so DISTINCT is on the name alone
+        unique_medicines = MedicineInventory.objects.order_by('medicine_name').values_list(
+            'medicine_name', flat=True
+        ).distinct()
+        unique_count = MedicineInventory.objects.aggregate(
+            total=Count('medicine_name', distinct=True)
+        )['total']
+        self.stdout.write(f"=== UNIQUE MEDICINES ({unique_count}) ===")
+        for medicine in unique_medicines.iterator(chunk_size=2000):
             self.stdout.write(f"- {medicine}")
\ No newline at end of file
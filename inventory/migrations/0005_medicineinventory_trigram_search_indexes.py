@@ -0,0 +1,34 @@
+from django.db import migrations
+
+# Trigram GIN indexes backing the admin/list icontains searches. pg_trgm is
+# PostgreSQL-only, so on SQLite these operations are skipped.
+SEARCH_FIELDS = ['medicine_name', 'batch_no', 'generic_name', 'manufacturer']
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS inventory_med_{field}_trgm '
+            f'ON inventory_medicineinventory USING gin ({field} gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS inventory_med_{field}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_stockalert_supplier_alter_dispensehistory_options_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
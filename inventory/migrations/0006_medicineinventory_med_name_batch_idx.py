@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-15 06:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_medicineinventory_trigram_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicineinventory',
+            index=models.Index(fields=['medicine_name', 'batch_no'], name='med_name_batch_idx'),
+        ),
+    ]
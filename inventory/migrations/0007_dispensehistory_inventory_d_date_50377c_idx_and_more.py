@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-15 06:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_medicineinventory_med_name_batch_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dispensehistory',
+            index=models.Index(fields=['date'], name='inventory_d_date_50377c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dispensehistory',
+            index=models.Index(fields=['medicine_name'], name='inventory_d_medicin_efd468_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-15 06:18
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_alerts(apps, schema_editor):
+    """Keep only the oldest alert for each medicine and alert type."""
+    StockAlert = apps.get_model('inventory', 'StockAlert')
+    keep_ids = (
+        StockAlert.objects.order_by()
+        .values('medicine_name', 'alert_type')
+        .annotate(first_id=Min('id'))
+        .values_list('first_id', flat=True)
+    )
+    StockAlert.objects.exclude(id__in=list(keep_ids)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_dispensehistory_inventory_d_date_50377c_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_alerts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='stockalert',
+            constraint=models.UniqueConstraint(fields=('medicine_name', 'alert_type'), name='unique_stock_alert_per_type'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+from django.db import migrations
+
+# FTS5 index backing the inventory list search on SQLite. The trigram
+# tokenizer keeps icontains semantics (case-insensitive substring match) for
+# terms of three or more characters. Triggers keep the external-content table
+# in sync with inventory_medicineinventory; signals.restore_fts_triggers
+# recreates them after later migrations rebuild that table. On PostgreSQL the
+# pg_trgm indexes from 0005 serve the same purpose, so these are skipped.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS inventory_fts USING fts5(
+        medicine_name, generic_name, batch_no, manufacturer,
+        content='inventory_medicineinventory', content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS inventory_fts_ai AFTER INSERT ON inventory_medicineinventory BEGIN
+        INSERT INTO inventory_fts(rowid, medicine_name, generic_name, batch_no, manufacturer)
+        VALUES (new.id, new.medicine_name, new.generic_name, new.batch_no, new.manufacturer);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS inventory_fts_ad AFTER DELETE ON inventory_medicineinventory BEGIN
+        INSERT INTO inventory_fts(inventory_fts, rowid, medicine_name, generic_name, batch_no, manufacturer)
+        VALUES ('delete', old.id, old.medicine_name, old.generic_name, old.batch_no, old.manufacturer);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS inventory_fts_au AFTER UPDATE ON inventory_medicineinventory BEGIN
+        INSERT INTO inventory_fts(inventory_fts, rowid, medicine_name, generic_name, batch_no, manufacturer)
+        VALUES ('delete', old.id, old.medicine_name, old.generic_name, old.batch_no, old.manufacturer);
+        INSERT INTO inventory_fts(rowid, medicine_name, generic_name, batch_no, manufacturer)
+        VALUES (new.id, new.medicine_name, new.generic_name, new.batch_no, new.manufacturer);
+    END
+    """,
+    "INSERT INTO inventory_fts(inventory_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS inventory_fts_ai',
+    'DROP TRIGGER IF EXISTS inventory_fts_ad',
+    'DROP TRIGGER IF EXISTS inventory_fts_au',
+    'DROP TABLE IF EXISTS inventory_fts',
+]
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_stockalert_unique_stock_alert_per_type'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-15 06:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_medicineinventory_fts_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicineinventory',
+            index=models.Index(fields=['created_at'], name='inventory_m_created_9399dc_idx'),
+        ),
+    ]
@@ -1,8 +1,61 @@
-from django.db import models
+from django.db import connections, models
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+class MedicineInventoryQuerySet(models.QuerySet):
+    """Queryset helpers that compute stock status in SQL"""
+
+    def with_balance(self):
+        """Annotate current_balance: total in minus total out for the row's medicine and batch"""
+        batch_balance = MedicineInventory.objects.filter(
+            medicine_name=models.OuterRef('medicine_name'),
+            batch_no=models.OuterRef('batch_no')
+        ).order_by().values('medicine_name', 'batch_no').annotate(
+            total=models.ExpressionWrapper(
+                models.Sum('quantity_in') - models.Sum('quantity_out'),
+                output_field=models.IntegerField()
+            )
+        ).values('total')
+        return self.annotate(
+            current_balance=Coalesce(
+                models.Subquery(batch_balance, output_field=models.IntegerField()), 0
+            )
+        )
+
+    def with_status(self):
+        """Annotate current_balance, expired and days_until_expiry in the same SELECT"""
+        today = timezone.now().date()
+        return self.with_balance().annotate(
+            expired=models.ExpressionWrapper(
+                models.Q(expiry_date__lte=today), output_field=models.BooleanField()
+            ),
+            days_until_expiry=models.ExpressionWrapper(
+                models.F('expiry_date') - models.Value(today, output_field=models.DateField()),
+                output_field=models.DurationField()
+            )
+        )
+
+    def search(self, query):
+        """Match query against name, generic name, batch and manufacturer
+
+        On SQLite, terms of three or more characters use the inventory_fts
+        trigram index; shorter terms and other backends use icontains.
+        """
+        if connections[self.db].vendor == 'sqlite' and len(query) >= 3:
+            phrase = '"%s"' % query.replace('"', '""')
+            return self.filter(pk__in=RawSQL(
+                'SELECT rowid FROM inventory_fts WHERE inventory_fts MATCH %s', (phrase,)
+            ))
+        return self.filter(
+            models.Q(medicine_name__icontains=query) |
+            models.Q(batch_no__icontains=query) |
+            models.Q(generic_name__icontains=query) |
+            models.Q(manufacturer__icontains=query)
+        )
 
 class MedicineInventory(models.Model):
     """Improved inventory model with backward compatibility"""
@@ -39,6 +92,8 @@ class MedicineInventory(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, null=True)
     updated_at = models.DateTimeField(auto_now=True, null=True)
 
+    objects = MedicineInventoryQuerySet.as_manager()
+
     class Meta:
         ordering = ['-date']
         indexes = [
@@ -46,6 +101,8 @@ class MedicineInventory(models.Model):
             models.Index(fields=['batch_no']),
             models.Index(fields=['expiry_date']),
             models.Index(fields=['date']),
+            models.Index(fields=['medicine_name', 'batch_no'], name='med_name_batch_idx'),
+            models.Index(fields=['created_at']),
         ]
 
     def clean(self):
@@ -54,25 +111,34 @@ class MedicineInventory(models.Model):
             raise ValidationError({'expiry_date': 'Expiry date must be in the future'})
 
     def balance(self):
-        """Calculate current balance for this medicine and batch"""
-        total_in = MedicineInventory.objects.filter(
-            medicine_name=self.medicine_name,
-            batch_no=self.batch_no
-        ).aggregate(total=models.Sum('quantity_in'))['total'] or 0
-        total_out = MedicineInventory.objects.filter(
+        """Calculate current balance for this medicine and batch
+
+        Records loaded through with_balance()/with_status() use their
+        annotation instead of querying.
+        """
+        if hasattr(self, 'current_balance'):
+            return self.current_balance
+        totals = MedicineInventory.objects.filter(
             medicine_name=self.medicine_name,
             batch_no=self.batch_no
-        ).aggregate(total=models.Sum('quantity_out'))['total'] or 0
-        return total_in - total_out
+        ).aggregate(
+            total_in=models.Sum('quantity_in'),
+            total_out=models.Sum('quantity_out')
+        )
+        return (totals['total_in'] or 0) - (totals['total_out'] or 0)
 
     @property
     def is_expired(self):
         """Check if medicine is expired"""
+        if hasattr(self, 'expired'):
+            return self.expired
         return self.expiry_date <= timezone.now().date()
 
     @property
     def days_to_expiry(self):
         """Calculate days until expiry"""
+        if hasattr(self, 'days_until_expiry'):
+            return self.days_until_expiry.days
         return (self.expiry_date - timezone.now().date()).days
 
     @property
@@ -116,6 +182,10 @@ class StockAlert(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        constraints = [
+            # One alert per medicine and type; lets inserts skip duplicates in SQL
+            models.UniqueConstraint(fields=['medicine_name', 'alert_type'], name='unique_stock_alert_per_type'),
+        ]
         
     def __str__(self):
         return f"{self.get_alert_type_display()} - {self.medicine_name}"
@@ -141,6 +211,10 @@ class DispenseHistory(models.Model):
     
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['date']),
+            models.Index(fields=['medicine_name']),
+        ]
         
     def __str__(self):
         return f"{self.medicine_name} to {self.dispensed_to} on {self.date.strftime('%Y-%m-%d')}"
\ No newline at end of file
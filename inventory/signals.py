@@ -0,0 +1,82 @@
+"""Signal handlers: stock cache invalidation and FTS trigger upkeep"""
+import time
+
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import MedicineInventory, DispenseHistory
+
+# Version stamp that cached dashboard/analytics pages and list counts are keyed
+# on. It lives in the default cache, so a bump only reaches other processes
+# when they share that cache (LocMemCache is per process).
+STATS_VERSION_KEY = 'stats_version'
+
+
+def stats_version():
+    """Current stock data version, created on first use"""
+    return cache.get_or_set(STATS_VERSION_KEY, time.time_ns, None)
+
+
+def bump_stats_version():
+    """Invalidate everything keyed on stats_version()"""
+    cache.set(STATS_VERSION_KEY, time.time_ns(), None)
+
+
+@receiver([post_save, post_delete], sender=MedicineInventory)
+@receiver([post_save, post_delete], sender=DispenseHistory)
+def stock_changed(sender, using, **kwargs):
+    """Bump the version once the write commits, so no reader caches the old state"""
+    transaction.on_commit(bump_stats_version, using=using)
+
+
+# Triggers that keep inventory_fts (migration 0009) in sync. Django's SQLite
+# schema editor rebuilds inventory_medicineinventory for most AlterField and
+# RemoveField operations, and the triggers are dropped with the old table.
+FTS_TRIGGERS = {
+    'inventory_fts_ai': """
+        CREATE TRIGGER IF NOT EXISTS inventory_fts_ai AFTER INSERT ON inventory_medicineinventory BEGIN
+            INSERT INTO inventory_fts(rowid, medicine_name, generic_name, batch_no, manufacturer)
+            VALUES (new.id, new.medicine_name, new.generic_name, new.batch_no, new.manufacturer);
+        END
+    """,
+    'inventory_fts_ad': """
+        CREATE TRIGGER IF NOT EXISTS inventory_fts_ad AFTER DELETE ON inventory_medicineinventory BEGIN
+            INSERT INTO inventory_fts(inventory_fts, rowid, medicine_name, generic_name, batch_no, manufacturer)
+            VALUES ('delete', old.id, old.medicine_name, old.generic_name, old.batch_no, old.manufacturer);
+        END
+    """,
+    'inventory_fts_au': """
+        CREATE TRIGGER IF NOT EXISTS inventory_fts_au AFTER UPDATE ON inventory_medicineinventory BEGIN
+            INSERT INTO inventory_fts(inventory_fts, rowid, medicine_name, generic_name, batch_no, manufacturer)
+            VALUES ('delete', old.id, old.medicine_name, old.generic_name, old.batch_no, old.manufacturer);
+            INSERT INTO inventory_fts(rowid, medicine_name, generic_name, batch_no, manufacturer)
+            VALUES (new.id, new.medicine_name, new.generic_name, new.batch_no, new.manufacturer);
+        END
+    """,
+}
+
+
+def restore_fts_triggers(sender, using, **kwargs):
+    """Recreate missing FTS triggers after migrate and reindex what they missed
+
+    Connected to post_migrate for the inventory app. Does nothing on other
+    backends, before 0009 has run, or when all triggers are in place.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT type, name FROM sqlite_master WHERE name = 'inventory_fts' OR name IN (%s)"
+            % ', '.join(['%s'] * len(FTS_TRIGGERS)),
+            list(FTS_TRIGGERS),
+        )
+        existing = {name for _, name in cursor.fetchall()}
+        if 'inventory_fts' not in existing or existing.issuperset(FTS_TRIGGERS):
+            return
+        with transaction.atomic(using=using):
+            for sql in FTS_TRIGGERS.values():
+                cursor.execute(sql)
+            cursor.execute("INSERT INTO inventory_fts(inventory_fts) VALUES ('rebuild')")
@@ -1,3 +1,408 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import pandas as pd
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import IntegrityError, connection, models, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import MedicineInventory, DispenseHistory, StockAlert
+from .signals import stats_version
+
+# Ledger columns compared between imports
+LEDGER_VALUES = (
+    'medicine_name', 'batch_no', 'date', 'expiry_date', 'quantity_in', 'quantity_out',
+    'dispensed_to', 'strength', 'notes'
+)
+
+
+def use_odf_engine():
+    """Patch import_ods to parse with odfpy instead of python-calamine"""
+    return mock.patch.multiple(
+        'inventory.management.commands.import_ods', CalamineWorkbook=None, ODS_ENGINE='odf'
+    )
+
+
+class ImportOdsTests(TestCase):
+    """import_ods end to end against small generated sheets"""
+
+    columns = ['Date', 'Medicine Name', 'Batch No', 'Strength', 'Expiry Date',
+               'Quantity In', 'Quantity Out', 'Dispensed To', 'Notes']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('admin', password='pw')
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def write_sheet(self, rows):
+        path = os.path.join(self.tmpdir, 'inventory.ods')
+        pd.DataFrame(rows, columns=self.columns).to_excel(path, engine='odf', index=False)
+        return path
+
+    def run_import(self, path, *args):
+        out = StringIO()
+        call_command('import_ods', path, *args, stdout=out)
+        return out.getvalue()
+
+    def ledger(self):
+        return list(MedicineInventory.objects.order_by('id').values_list(*LEDGER_VALUES))
+
+    def test_results_do_not_depend_on_batch_size(self):
+        # Para's batch and some strengths are blank, so inferring numeric
+        # dtypes would read 777 as '777.0' in only the chunks holding a blank
+        path = self.write_sheet([
+            ['2024-01-01', 'Amox', 12345, '500mg', '2030-01-01', 10, 0, None, None],
+            ['2024-01-01', 'Ibu', 777, None, '2030-01-01', 20, 0, None, None],
+            ['2024-01-02', 'Ibu', 777, None, '2030-01-01', 0, 5, 'Alice', None],
+            ['2024-01-02', 'Para', None, 250, '2030-01-01', 7, 0, None, 'shelf 2'],
+            ['2024-01-03', 'Ibu', 777, 400, '2030-01-01', 0, 1, 'Bob', None],
+        ])
+        results = []
+        for engine in ('calamine', 'odf'):
+            for batch_size in (2, 500):
+                MedicineInventory.objects.all().delete()
+                with override_settings(IMPORT_BATCH_SIZE=batch_size):
+                    if engine == 'odf':
+                        with use_odf_engine():
+                            self.run_import(path)
+                    else:
+                        self.run_import(path)
+                results.append(self.ledger())
+
+        for result in results[1:]:
+            self.assertEqual(result, results[0])
+        batches = {row[0]: row[1] for row in results[0]}
+        self.assertEqual(batches['Amox'], '12345')
+        self.assertEqual(batches['Ibu'], '777')
+        self.assertEqual(batches['Para'], '')
+
+
+    def test_reimport_skips_stored_rows_but_keeps_repeats_within_a_file(self):
+        path = self.write_sheet([
+            ['2024-01-01', 'Amox', 'B1', None, '2030-01-01', 10, 0, None, None],
+            ['2024-01-02', 'Amox', 'B1', None, '2030-01-01', 0, 2, 'Alice', None],
+            ['2024-01-02', 'Amox', 'B1', None, '2030-01-01', 0, 2, 'Alice', None],
+        ])
+        self.run_import(path)
+        self.assertEqual(MedicineInventory.objects.count(), 3)
+        self.assertEqual(DispenseHistory.objects.count(), 2)
+
+        self.run_import(path)
+        self.assertEqual(MedicineInventory.objects.count(), 3)
+        self.assertEqual(DispenseHistory.objects.count(), 2)
+
+    @override_settings(IMPORT_BATCH_SIZE=2)
+    def test_chunked_import_links_every_dispense(self):
+        rows = [['2024-01-01', 'Amox', 'B1', None, '2030-01-01', 50, 0, None, None]]
+        rows += [['2024-01-02', 'Amox', 'B1', None, '2030-01-01', 0, 1, f'Patient {i}', None] for i in range(6)]
+        self.run_import(self.write_sheet(rows))
+
+        self.assertEqual(MedicineInventory.objects.count(), 7)
+        self.assertEqual(MedicineInventory.objects.get(quantity_in=50).balance(), 44)
+        dispenses = DispenseHistory.objects.select_related('inventory_record')
+        self.assertEqual(len(dispenses), 6)
+        for dispense in dispenses:
+            self.assertEqual(dispense.inventory_record.dispensed_to, dispense.dispensed_to)
+            self.assertEqual(dispense.dispensed_by, self.user)
+
+
+def inventory_row(name, **fields):
+    values = {
+        'date': date.today(), 'medicine_name': name, 'batch_no': 'B1',
+        'expiry_date': date.today() + timedelta(days=365), 'quantity_in': 10,
+    }
+    values.update(fields)
+    return MedicineInventory.objects.create(**values)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'inventory_fts is SQLite only')
+class FtsTriggerTests(TransactionTestCase):
+    """inventory_fts stays in sync across migrations that rebuild the table"""
+
+    def fts_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'inventory_fts_%'")
+            return {name for name, in cursor.fetchall()}
+
+    def alter_manufacturer(self, max_length):
+        old_field = MedicineInventory._meta.get_field('manufacturer')
+        new_field = models.CharField(max_length=max_length, blank=True)
+        new_field.set_attributes_from_name('manufacturer')
+        new_field.model = MedicineInventory
+        with connection.schema_editor() as editor:
+            editor.alter_field(MedicineInventory, old_field, new_field)
+
+    def test_search_finds_rows_inserted_after_table_rebuild(self):
+        inventory_row('Cetirizine')
+        self.alter_manufacturer(250)
+        self.addCleanup(emit_post_migrate_signal, 0, False, connection.alias)
+        self.addCleanup(self.alter_manufacturer, 200)
+        self.assertEqual(self.fts_triggers(), set())
+
+        # A row written between the rebuild and post_migrate is picked up by
+        # the reindex; one written afterwards by the restored triggers
+        inventory_row('Loratadine')
+        emit_post_migrate_signal(0, False, connection.alias)
+        self.assertEqual(self.fts_triggers(), {'inventory_fts_ai', 'inventory_fts_ad', 'inventory_fts_au'})
+        inventory_row('Zyrtec', manufacturer='x' * 240)
+
+        found = MedicineInventory.objects.search
+        self.assertEqual(list(found('zyrt').values_list('medicine_name', flat=True)), ['Zyrtec'])
+        self.assertEqual(list(found('lorat').values_list('medicine_name', flat=True)), ['Loratadine'])
+        self.assertEqual(list(found('cetir').values_list('medicine_name', flat=True)), ['Cetirizine'])
+
+
+class ImportCsvTests(TestCase):
+    """import_csv dedupes against stored rows only"""
+
+    header = 'medicine_name,batch_no,date,expiry_date,quantity_in,quantity_out,dispensed_to\n'
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user('admin', password='pw')
+
+    def run_import(self, text):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w') as f:
+            f.write(self.header + text)
+        with mock.patch('builtins.input', return_value='y'):
+            call_command('import_csv', path, stdout=StringIO())
+
+    def test_reimport_skips_stored_rows_but_keeps_repeats_within_a_file(self):
+        rows = ('Amox,B1,2024-01-02,2030-01-01,0,2,Alice\n'
+                'Amox,B1,2024-01-02,2030-01-01,0,2,Alice\n')
+        self.run_import(rows)
+        self.assertEqual(MedicineInventory.objects.count(), 2)
+
+        self.run_import(rows + 'Amox,B1,2024-01-03,2030-01-01,0,1,Bob\n')
+        self.assertEqual(MedicineInventory.objects.count(), 3)
+
+
+class QuickDispenseTests(TestCase):
+    """quick_dispense writes a ledger row and its dispense history together"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('pharmacist', password='pw')
+        inventory_row('Amoxicillin', dosage_form='capsule', created_by=cls.user)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def dispense(self, quantity):
+        return self.client.post(reverse('quick_dispense'), {
+            'medicine_name': 'Amoxicillin', 'batch_no': 'B1', 'quantity': quantity,
+            'patient_name': 'Alice', 'prescribing_doctor': 'Dr. Bob',
+        })
+
+    def test_dispense_records_ledger_row_and_history(self):
+        response = self.dispense(4)
+
+        self.assertRedirects(response, reverse('inventory_list'))
+        entry = MedicineInventory.objects.get(quantity_out=4)
+        self.assertEqual((entry.dosage_form, entry.dispensed_to), ('capsule', 'Alice'))
+        self.assertEqual(entry.balance(), 6)
+        history = DispenseHistory.objects.get()
+        self.assertEqual(history.inventory_record, entry)
+        self.assertEqual(history.dispensed_by, self.user)
+
+    def test_insufficient_stock_is_rejected(self):
+        response = self.dispense(11)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Insufficient stock available.')
+        self.assertEqual(MedicineInventory.objects.count(), 1)
+        self.assertFalse(DispenseHistory.objects.exists())
+
+
+class QuickDispenseLockTests(TransactionTestCase):
+    """The stock check and the write run under the batch's write lock"""
+
+    def test_batch_is_locked_before_the_stock_check(self):
+        user = User.objects.create_user('pharmacist', password='pw')
+        inventory_row('Amoxicillin')
+        self.client.force_login(user)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('quick_dispense'), {
+                'medicine_name': 'Amoxicillin', 'batch_no': 'B1', 'quantity': 1, 'patient_name': 'Alice',
+            })
+
+        sql = [query['sql'] for query in queries.captured_queries]
+        if connection.vendor == 'sqlite':
+            # SQLite has no row locks; the transaction takes the write lock up front
+            self.assertIn('BEGIN IMMEDIATE', sql)
+            lock_at = sql.index('BEGIN IMMEDIATE')
+        else:
+            lock_at = next(i for i, query in enumerate(sql) if 'FOR UPDATE' in query)
+        first_read = next(i for i, query in enumerate(sql) if 'inventory_medicineinventory' in query)
+        self.assertLessEqual(lock_at, first_read)
+        self.assertEqual(DispenseHistory.objects.count(), 1)
+
+
+class StatsVersionTests(TestCase):
+    """Cached dashboard pages are dropped as soon as stock changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('pharmacist', password='pw')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_committed_stock_writes_bump_the_version(self):
+        for write in (
+            lambda: inventory_row('Amoxicillin'),
+            lambda: DispenseHistory.objects.create(
+                medicine_name='Amoxicillin', dosage_form='capsule', batch_no='B1',
+                dispensed_to='Alice', quantity_out=1),
+            lambda: MedicineInventory.objects.get().delete(),
+        ):
+            before = stats_version()
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+            self.assertNotEqual(stats_version(), before)
+
+    def test_version_waits_for_commit(self):
+        before = stats_version()
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            inventory_row('Amoxicillin')
+        self.assertEqual(stats_version(), before)
+        self.assertTrue(callbacks)
+
+    def test_dashboard_is_rendered_again_after_a_write(self):
+        url = reverse('dashboard')
+        # The first response sets the CSRF cookie, which the cache varies on
+        self.client.get(url)
+        first = self.client.get(url)
+        self.assertEqual(first.context['total_medicines'], 0)
+        self.assertIn('private', first['Cache-Control'])
+        self.assertIsNone(self.client.get(url).context)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            inventory_row('Amoxicillin')
+
+        response = self.client.get(url)
+        self.assertIsNotNone(response.context)
+        self.assertEqual(response.context['total_medicines'], 1)
+
+
+class SearchTests(TestCase):
+    """search() matches the same rows on the FTS path as icontains"""
+
+    @classmethod
+    def setUpTestData(cls):
+        inventory_row('Amoxicillin', generic_name='amoxicillin trihydrate', manufacturer='GSK')
+        inventory_row('Ibuprofen', batch_no='IBU-2024', manufacturer='Abbott')
+        inventory_row('Co-Amoxiclav', manufacturer='Sandoz')
+        inventory_row('Paracetamol', generic_name='acetaminophen', batch_no='P"1')
+
+    def icontains(self, query):
+        return MedicineInventory.objects.filter(
+            models.Q(medicine_name__icontains=query) |
+            models.Q(batch_no__icontains=query) |
+            models.Q(generic_name__icontains=query) |
+            models.Q(manufacturer__icontains=query)
+        )
+
+    def test_matches_icontains(self):
+        for query in ('amox', 'AMOXI', 'ibu-20', 'bott', 'aceta', 'P"1', 'GS', 'nothing here'):
+            with self.subTest(query=query):
+                self.assertQuerySetEqual(
+                    MedicineInventory.objects.search(query).order_by('pk'),
+                    self.icontains(query).order_by('pk'),
+                )
+
+    def test_index_follows_updates_and_deletes(self):
+        row = MedicineInventory.objects.get(medicine_name='Ibuprofen')
+        row.medicine_name = 'Naproxen'
+        row.save()
+        self.assertFalse(MedicineInventory.objects.search('ibuprofen').exists())
+        self.assertTrue(MedicineInventory.objects.search('naprox').exists())
+
+        row.delete()
+        self.assertFalse(MedicineInventory.objects.search('naprox').exists())
+
+
+class StockAlertTests(TestCase):
+    """One alert per medicine and alert type"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('pharmacist', password='pw')
+
+    def test_check_alerts_does_not_repeat_alerts(self):
+        today = date.today()
+        inventory_row('Expired', batch_no='E1', expiry_date=today - timedelta(days=1))
+        inventory_row('Expired', batch_no='E2', expiry_date=today - timedelta(days=3))
+        inventory_row('Soon', expiry_date=today + timedelta(days=5), quantity_in=100)
+        inventory_row('Low', quantity_in=2, minimum_stock_level=5)
+        expected = [('Expired', 'expired'), ('Low', 'low_stock'), ('Soon', 'near_expiry')]
+
+        call_command('check_alerts', stdout=StringIO())
+        self.assertEqual(sorted(StockAlert.objects.values_list('medicine_name', 'alert_type')), expected)
+
+        call_command('check_alerts', stdout=StringIO())
+        self.assertEqual(StockAlert.objects.count(), len(expected))
+
+    def test_add_inventory_raises_one_low_stock_alert(self):
+        self.client.force_login(self.user)
+        today = date.today()
+        for quantity_in in (2, 1):
+            response = self.client.post(reverse('add_inventory'), {
+                'date': today, 'medicine_name': 'Amoxicillin', 'dosage_form': 'capsule', 'batch_no': 'B1',
+                'expiry_date': today + timedelta(days=365), 'quantity_in': quantity_in, 'quantity_out': 0,
+                'minimum_stock_level': 10,
+            })
+            self.assertRedirects(response, reverse('inventory_list'))
+
+        self.assertEqual(StockAlert.objects.filter(medicine_name='Amoxicillin', alert_type='low_stock').count(), 1)
+
+    def test_constraint_rejects_duplicates(self):
+        StockAlert.objects.create(medicine_name='Amoxicillin', alert_type='low_stock', message='first')
+        StockAlert.objects.create(medicine_name='Amoxicillin', alert_type='expired', message='other type')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            StockAlert.objects.create(medicine_name='Amoxicillin', alert_type='low_stock', message='again')
+
+
+class StockAlertMigrationTests(TransactionTestCase):
+    """0008 drops duplicate alerts before adding the unique constraint"""
+
+    before = [('inventory', '0007_dispensehistory_inventory_d_date_50377c_idx_and_more')]
+    after = [('inventory', '0008_stockalert_unique_stock_alert_per_type')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def test_keeps_the_oldest_alert_of_each_type(self):
+        leaf = MigrationExecutor(connection).loader.graph.leaf_nodes('inventory')
+        self.addCleanup(self.migrate, leaf)
+
+        old_apps = self.migrate(self.before)
+        OldStockAlert = old_apps.get_model('inventory', 'StockAlert')
+        first = OldStockAlert.objects.create(medicine_name='Amox', alert_type='low_stock', message='1')
+        OldStockAlert.objects.create(medicine_name='Amox', alert_type='low_stock', message='2')
+        expired = OldStockAlert.objects.create(medicine_name='Amox', alert_type='expired', message='3')
+        OldStockAlert.objects.create(medicine_name='Amox', alert_type='low_stock', message='4')
+
+        new_apps = self.migrate(self.after)
+        NewStockAlert = new_apps.get_model('inventory', 'StockAlert')
+        self.assertEqual(sorted(NewStockAlert.objects.values_list('pk', flat=True)), [first.pk, expired.pk])
@@ -12,6 +12,7 @@ urlpatterns = [
     path('quick-dispense/', views.quick_dispense, name='quick_dispense'),
     path('alerts/', views.stock_alerts, name='stock_alerts'),
     path('analytics-data/', views.analytics_data, name='analytics_data'),
+    path('medicine-autocomplete/', views.medicine_autocomplete, name='medicine_autocomplete'),
     path('reports/', views.generate_reports, name='generate_reports'),
     path('export-csv/', views.export_inventory_csv, name='export_csv'),
 ]
\ No newline at end of file
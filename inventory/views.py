@@ -2,31 +2,60 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.db.models import Q, Sum, Count, Avg
-from django.http import JsonResponse, HttpResponse
+from django.db import transaction
+from django.db.models import Q, F, Sum, Count, Avg
+from django.db.models.functions import TruncDate
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.functional import cached_property
+from django.views.decorators.cache import cache_control, cache_page
 from django.views.decorators.http import require_http_methods
+from django.views.decorators.vary import vary_on_cookie
 import json
 import csv
+import hashlib
+from functools import wraps
 from datetime import datetime, timedelta
 
 from .models import MedicineInventory, DispenseHistory, Supplier, StockAlert
 from .forms import MedicineInventoryForm, QuickDispenseForm, SupplierForm
+from .signals import stats_version
+
+class CachedCountPaginator(Paginator):
+    """Paginator that caches COUNT(*) per query for a minute.
+
+    Paging through the same filtered list reuses the count instead of
+    re-running it on every click. Keys include the stats version, so any
+    inventory or dispense write starts fresh counts.
+    """
+    count_timeout = 60
+
+    @cached_property
+    def count(self):
+        try:
+            sql = str(self.object_list.query)
+        except (AttributeError, EmptyResultSet):
+            # Not a queryset, or one that can't match anything
+            return super().count
+        digest = hashlib.md5(sql.encode(), usedforsecurity=False).hexdigest()
+        key = f'qs_count:{stats_version()}:{digest}'
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, self.count_timeout)
+        return count
 
 @login_required
 def inventory_list(request):
     """Enhanced inventory list with filtering, sorting, and pagination"""
-    inventory_list = MedicineInventory.objects.select_related('created_by')
+    inventory_list = MedicineInventory.objects.select_related('created_by').with_status()
     
     # Search functionality
     query = request.GET.get('q')
     if query:
-        inventory_list = inventory_list.filter(
-            Q(medicine_name__icontains=query) | 
-            Q(batch_no__icontains=query) |
-            Q(generic_name__icontains=query) |
-            Q(manufacturer__icontains=query)
-        )
+        inventory_list = inventory_list.search(query)
     
     # Filter by dosage form
     dosage_form = request.GET.get('dosage_form')
@@ -46,13 +75,9 @@ def inventory_list(request):
     
     # Filter by stock level
     stock_filter = request.GET.get('stock')
-    low_stock_items = []
     if stock_filter == 'low':
-        # Get items with low stock
-        for item in inventory_list:
-            if item.is_low_stock:
-                low_stock_items.append(item.id)
-        inventory_list = inventory_list.filter(id__in=low_stock_items)
+        # Batch balance is annotated by with_status(), so this filters in SQL
+        inventory_list = inventory_list.filter(current_balance__lt=F('minimum_stock_level'))
     
     # Sorting
     sort_by = request.GET.get('sort', '-date')
@@ -61,10 +86,10 @@ def inventory_list(request):
         inventory_list = inventory_list.order_by(sort_by)
     
     # Get unique dosage forms for filter
-    dosage_forms = MedicineInventory.objects.values_list('dosage_form', flat=True).distinct()
+    dosage_forms = dosage_form_names()
     
     # Pagination
-    paginator = Paginator(inventory_list, 25)  # Show 25 items per page
+    paginator = CachedCountPaginator(inventory_list, 25)  # Show 25 items per page
     page = request.GET.get('page')
     
     try:
@@ -74,9 +99,13 @@ def inventory_list(request):
     except EmptyPage:
         inventory = paginator.page(paginator.num_pages)
     
-    # Quick stats
-    total_medicines = MedicineInventory.objects.values('medicine_name').distinct().count()
-    expired_count = MedicineInventory.objects.filter(expiry_date__lte=timezone.now().date()).count()
+    # Quick stats in a single aggregate query
+    quick_stats = MedicineInventory.objects.aggregate(
+        total_medicines=Count('medicine_name', distinct=True),
+        expired_count=Count('id', filter=Q(expiry_date__lte=timezone.now().date()))
+    )
+    total_medicines = quick_stats['total_medicines'] or 0
+    expired_count = quick_stats['expired_count']
     
     context = {
         'inventory': inventory,
@@ -92,38 +121,88 @@ def inventory_list(request):
     
     return render(request, 'inventory_list.html', context)
 
+def dosage_form_names():
+    """Distinct dosage forms for the list filter, cached for ten minutes"""
+    return cache.get_or_set(
+        'dosage_forms',
+        lambda: list(
+            MedicineInventory.objects.order_by('dosage_form').values_list('dosage_form', flat=True).distinct()
+        ),
+        600
+    )
+
+def cache_until_stock_changes(timeout):
+    """cache_page keyed on the stats version, so stock writes invalidate it at once
+
+    The version is bumped by the post_save/post_delete handlers in signals.py,
+    so admin edits and other writers are covered as well as these views.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            cached_view = cache_page(timeout, key_prefix=f'stats:{stats_version()}')(view_func)
+            return cached_view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+def supplier_names():
+    """Supplier names for the form datalist, cached for five minutes"""
+    return cache.get_or_set(
+        'suppliers_all',
+        lambda: list(Supplier.objects.values_list('name', flat=True)),
+        300
+    )
+
+@login_required
+def medicine_autocomplete(request):
+    """Return up to 20 distinct medicine names starting with ?q= for autocomplete"""
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'results': []})
+
+    names = MedicineInventory.objects.filter(
+        medicine_name__istartswith=query
+    ).order_by('medicine_name').values_list('medicine_name', flat=True).distinct()[:20]
+    return JsonResponse({'results': list(names)})
+
 @login_required
 def add_inventory(request):
     """Enhanced add inventory with better validation and messages"""
     if request.method == 'POST':
         form = MedicineInventoryForm(request.POST)
         if form.is_valid():
-            inventory = form.save(commit=False)
-            inventory.created_by = request.user
-            inventory.save()
-            
-            # Create dispense history if quantity_out > 0
-            if inventory.quantity_out > 0:
-                DispenseHistory.objects.create(
-                    medicine_name=inventory.medicine_name,
-                    dosage_form=inventory.dosage_form,
-                    batch_no=inventory.batch_no,
-                    dispensed_to=inventory.dispensed_to,
-                    quantity_out=inventory.quantity_out,
-                    dispensed_by=request.user,
-                    inventory_record=inventory
-                )
-                messages.success(request, f'Medicine "{inventory.medicine_name}" dispensed successfully.')
-            else:
-                messages.success(request, f'Medicine "{inventory.medicine_name}" added to inventory successfully.')
-            
-            # Check for low stock alerts
-            if inventory.is_low_stock:
-                StockAlert.objects.get_or_create(
-                    medicine_name=inventory.medicine_name,
-                    alert_type='low_stock',
-                    defaults={'message': f'Stock is running low for {inventory.medicine_name}'}
-                )
+            # Inventory row, dispense history and low-stock alert commit together
+            with transaction.atomic():
+                inventory = form.save(commit=False)
+                inventory.created_by = request.user
+                inventory.save()
+                
+                # Create dispense history if quantity_out > 0
+                if inventory.quantity_out > 0:
+                    DispenseHistory.objects.create(
+                        medicine_name=inventory.medicine_name,
+                        dosage_form=inventory.dosage_form,
+                        batch_no=inventory.batch_no,
+                        dispensed_to=inventory.dispensed_to,
+                        quantity_out=inventory.quantity_out,
+                        dispensed_by=request.user,
+                        inventory_record=inventory
+                    )
+                    messages.success(request, f'Medicine "{inventory.medicine_name}" dispensed successfully.')
+                else:
+                    messages.success(request, f'Medicine "{inventory.medicine_name}" added to inventory successfully.')
+                
+                # Check for low stock alerts
+                if inventory.is_low_stock:
+                    # Single INSERT; the unique constraint skips an existing alert
+                    StockAlert.objects.bulk_create([
+                        StockAlert(
+                            medicine_name=inventory.medicine_name,
+                            alert_type='low_stock',
+                            message=f'Stock is running low for {inventory.medicine_name}',
+                        )
+                    ], ignore_conflicts=True)
+            cache.delete('dosage_forms')
             
             return redirect('inventory_list')
         else:
@@ -131,14 +210,11 @@ def add_inventory(request):
     else:
         form = MedicineInventoryForm()
     
-    # Get suppliers and medicines for autocomplete
-    suppliers = Supplier.objects.all()
-    medicines = MedicineInventory.objects.values_list('medicine_name', flat=True).distinct()
-    
+    # Supplier names for autocomplete; medicine names are fetched on demand
+    # from medicine_autocomplete as the user types
     context = {
         'form': form,
-        'suppliers': suppliers,
-        'medicines': medicines,
+        'suppliers': supplier_names(),
         'title': 'Add Medicine to Inventory'
     }
     return render(request, 'inventory_form.html', context)
@@ -152,6 +228,7 @@ def edit_inventory(request, pk):
         form = MedicineInventoryForm(request.POST, instance=item)
         if form.is_valid():
             form.save()
+            cache.delete('dosage_forms')
             messages.success(request, f'Medicine "{item.medicine_name}" updated successfully.')
             return redirect('inventory_list')
         else:
@@ -159,14 +236,10 @@ def edit_inventory(request, pk):
     else:
         form = MedicineInventoryForm(instance=item)
     
-    suppliers = Supplier.objects.all()
-    medicines = MedicineInventory.objects.values_list('medicine_name', flat=True).distinct()
-    
     context = {
         'form': form,
         'item': item,
-        'suppliers': suppliers,
-        'medicines': medicines,
+        'suppliers': supplier_names(),
         'title': f'Edit {item.medicine_name}'
     }
     return render(request, 'inventory_form.html', context)
@@ -179,6 +252,7 @@ def delete_inventory(request, pk):
     if request.method == 'POST':
         medicine_name = item.medicine_name
         item.delete()
+        cache.delete('dosage_forms')
         messages.success(request, f'Medicine "{medicine_name}" deleted successfully.')
         return redirect('inventory_list')
     
@@ -187,17 +261,18 @@ def delete_inventory(request, pk):
 @login_required
 def medicine_detail(request, pk):
     """Enhanced medicine detail view with related records"""
-    medicine = get_object_or_404(MedicineInventory, pk=pk)
+    # Balance is annotated so the template and total_stock don't each query it
+    medicine = get_object_or_404(MedicineInventory.objects.with_balance(), pk=pk)
     
     # Get all records for this medicine
     related_records = MedicineInventory.objects.filter(
         medicine_name=medicine.medicine_name
-    ).order_by('-date')
+    ).select_related('created_by').order_by('-date')
     
     # Get dispense history
     dispense_records = DispenseHistory.objects.filter(
         medicine_name=medicine.medicine_name
-    ).order_by('-date')[:10]
+    ).select_related('dispensed_by', 'inventory_record').order_by('-date')[:10]
     
     # Calculate total stock
     total_stock = medicine.balance()
@@ -231,7 +306,7 @@ def dispense_history(request):
         history_list = history_list.filter(medicine_name__icontains=medicine)
     
     # Pagination
-    paginator = Paginator(history_list, 20)
+    paginator = CachedCountPaginator(history_list, 20)
     page = request.GET.get('page')
     
     try:
@@ -258,46 +333,46 @@ def quick_dispense(request):
         if form.is_valid():
             # Check if medicine exists and has sufficient stock
             try:
-                inventory_item = MedicineInventory.objects.filter(
-                    medicine_name=form.cleaned_data['medicine_name'],
-                    batch_no=form.cleaned_data['batch_no']
-                ).first()
-                
-                if not inventory_item:
-                    messages.error(request, 'Medicine with specified batch number not found.')
-                    return render(request, 'quick_dispense.html', {'form': form})
-                
-                if inventory_item.balance() < form.cleaned_data['quantity']:
-                    messages.error(request, 'Insufficient stock available.')
-                    return render(request, 'quick_dispense.html', {'form': form})
-                
-                # Create dispense record
-                MedicineInventory.objects.create(
-                    date=timezone.now().date(),
-                    medicine_name=form.cleaned_data['medicine_name'],
-                    dosage_form=inventory_item.dosage_form,
-                    batch_no=form.cleaned_data['batch_no'],
-                    expiry_date=inventory_item.expiry_date,
-                    quantity_in=0,
-                    quantity_out=form.cleaned_data['quantity'],
-                    dispensed_to=form.cleaned_data['patient_name'],
-                    prescribing_doctor=form.cleaned_data['prescribing_doctor'],
-                    created_by=request.user
-                )
-                
-                # Create dispense history
-                DispenseHistory.objects.create(
-                    medicine_name=form.cleaned_data['medicine_name'],
-                    dosage_form=inventory_item.dosage_form,
-                    batch_no=form.cleaned_data['batch_no'],
-                    dispensed_to=form.cleaned_data['patient_name'],
-                    quantity_out=form.cleaned_data['quantity'],
-                    dispensed_by=request.user,
-                    prescribing_doctor=form.cleaned_data['prescribing_doctor']
-                )
-                
-                messages.success(request, f'Dispensed {form.cleaned_data["quantity"]} units of {form.cleaned_data["medicine_name"]} to {form.cleaned_data["patient_name"]}.')
-                return redirect('inventory_list')
+                # Lock the batch so concurrent dispenses can't both pass the stock check
+                with transaction.atomic():
+                    inventory_item = form.lookup_inventory(lock=True)
+                    
+                    if not inventory_item:
+                        messages.error(request, 'Medicine with specified batch number not found.')
+                        return render(request, 'quick_dispense.html', {'form': form})
+                    
+                    if inventory_item.balance() < form.cleaned_data['quantity']:
+                        messages.error(request, 'Insufficient stock available.')
+                        return render(request, 'quick_dispense.html', {'form': form})
+                    
+                    # Create dispense record
+                    dispense_entry = MedicineInventory.objects.create(
+                        date=timezone.now().date(),
+                        medicine_name=form.cleaned_data['medicine_name'],
+                        dosage_form=inventory_item.dosage_form,
+                        batch_no=form.cleaned_data['batch_no'],
+                        expiry_date=inventory_item.expiry_date,
+                        quantity_in=0,
+                        quantity_out=form.cleaned_data['quantity'],
+                        dispensed_to=form.cleaned_data['patient_name'],
+                        prescribing_doctor=form.cleaned_data['prescribing_doctor'],
+                        created_by=request.user
+                    )
+                    
+                    # Create dispense history
+                    DispenseHistory.objects.create(
+                        medicine_name=form.cleaned_data['medicine_name'],
+                        dosage_form=inventory_item.dosage_form,
+                        batch_no=form.cleaned_data['batch_no'],
+                        dispensed_to=form.cleaned_data['patient_name'],
+                        quantity_out=form.cleaned_data['quantity'],
+                        dispensed_by=request.user,
+                        prescribing_doctor=form.cleaned_data['prescribing_doctor'],
+                        inventory_record=dispense_entry
+                    )
+                    
+                    messages.success(request, f'Dispensed {form.cleaned_data["quantity"]} units of {form.cleaned_data["medicine_name"]} to {form.cleaned_data["patient_name"]}.')
+                    return redirect('inventory_list')
                 
             except Exception as e:
                 messages.error(request, f'Error processing dispense: {str(e)}')
@@ -307,40 +382,44 @@ def quick_dispense(request):
     return render(request, 'quick_dispense.html', {'form': form})
 
 @login_required
+@cache_control(private=True, max_age=0)
+@cache_until_stock_changes(60)
+@vary_on_cookie
 def dashboard(request):
     """Enhanced dashboard with analytics and insights"""
-    from django.db.models import Sum, Count, Avg, F
-    from datetime import timedelta
-    
-    # Basic statistics
-    total_medicines = MedicineInventory.objects.values('medicine_name').distinct().count()
-    total_inventory_value = MedicineInventory.objects.aggregate(
-        total=Sum(F('quantity_in') * F('unit_cost'))
-    )['total'] or 0
-    
-    # Expiry analysis
     today = timezone.now().date()
-    expired_items = MedicineInventory.objects.filter(expiry_date__lte=today)
-    expiring_soon = MedicineInventory.objects.filter(
-        expiry_date__gt=today,
-        expiry_date__lte=today + timedelta(days=30)
+    expired_filter = Q(expiry_date__lte=today)
+    expiring_soon_filter = Q(expiry_date__gt=today, expiry_date__lte=today + timedelta(days=30))
+    low_stock_filter = Q(current_balance__lt=F('minimum_stock_level'))
+
+    # Basic statistics, expiry and low-stock counts and monthly additions in one pass
+    stats = MedicineInventory.objects.with_balance().aggregate(
+        total_medicines=Count('medicine_name', distinct=True),
+        total_inventory_value=Sum(F('quantity_in') * F('unit_cost')),
+        expired_count=Count('id', filter=expired_filter),
+        expiring_soon_count=Count('id', filter=expiring_soon_filter),
+        low_stock_count=Count('id', filter=low_stock_filter),
+        monthly_additions=Sum('quantity_in', filter=Q(quantity_in__gt=0, date__gte=today - timedelta(days=30)))
     )
     
-    # Low stock analysis
-    low_stock_items = []
-    for item in MedicineInventory.objects.all():
-        if item.is_low_stock:
-            low_stock_items.append(item)
+    # Expiry and low stock alerts: counts come from stats, so only five rows
+    # of the columns the alert messages use are fetched for each
+    alert_fields = ('id', 'medicine_name', 'batch_no', 'expiry_date')
+    expired_items = MedicineInventory.objects.filter(expired_filter).only(*alert_fields)[:5]
+    expiring_soon = MedicineInventory.objects.filter(expiring_soon_filter).only(*alert_fields)[:5]
+    low_stock_items = (
+        MedicineInventory.objects.with_balance().filter(low_stock_filter).only(*alert_fields)[:5]
+    )
     
     # Recent activity
     recent_additions = MedicineInventory.objects.filter(
         quantity_in__gt=0,
         created_at__gte=timezone.now() - timedelta(days=7)
-    ).order_by('-created_at')[:5]
+    ).order_by('-created_at').only('medicine_name', 'batch_no', 'quantity_in', 'created_at')[:5]
     
     recent_dispenses = DispenseHistory.objects.filter(
         date__gte=timezone.now() - timedelta(days=7)
-    ).order_by('-date')[:5]
+    ).order_by('-date').only('medicine_name', 'quantity_out', 'date', 'dispensed_to')[:5]
     
     # Top medicines by usage
     top_dispensed = DispenseHistory.objects.values('medicine_name').annotate(
@@ -348,11 +427,6 @@ def dashboard(request):
     ).order_by('-total_dispensed')[:5]
     
     # Monthly trends
-    monthly_additions = MedicineInventory.objects.filter(
-        quantity_in__gt=0,
-        date__gte=today - timedelta(days=30)
-    ).aggregate(total=Sum('quantity_in'))['total'] or 0
-    
     monthly_dispenses = DispenseHistory.objects.filter(
         date__gte=today - timedelta(days=30)
     ).aggregate(total=Sum('quantity_out'))['total'] or 0
@@ -361,7 +435,7 @@ def dashboard(request):
     alerts = []
     
     # Add expired items alerts
-    for item in expired_items[:5]:
+    for item in expired_items:
         alerts.append({
             'type': 'danger',
             'icon': 'exclamation-triangle',
@@ -371,7 +445,7 @@ def dashboard(request):
         })
     
     # Add expiring soon alerts
-    for item in expiring_soon[:5]:
+    for item in expiring_soon:
         alerts.append({
             'type': 'warning',
             'icon': 'clock',
@@ -381,7 +455,7 @@ def dashboard(request):
         })
     
     # Add low stock alerts
-    for item in low_stock_items[:5]:
+    for item in low_stock_items:
         alerts.append({
             'type': 'info',
             'icon': 'box',
@@ -391,15 +465,15 @@ def dashboard(request):
         })
     
     context = {
-        'total_medicines': total_medicines,
-        'total_inventory_value': total_inventory_value,
-        'expired_count': expired_items.count(),
-        'expiring_soon_count': expiring_soon.count(),
-        'low_stock_count': len(low_stock_items),
+        'total_medicines': stats['total_medicines'] or 0,
+        'total_inventory_value': stats['total_inventory_value'] or 0,
+        'expired_count': stats['expired_count'],
+        'expiring_soon_count': stats['expiring_soon_count'],
+        'low_stock_count': stats['low_stock_count'],
         'recent_additions': recent_additions,
         'recent_dispenses': recent_dispenses,
         'top_dispensed': top_dispensed,
-        'monthly_additions': monthly_additions,
+        'monthly_additions': stats['monthly_additions'] or 0,
         'monthly_dispenses': monthly_dispenses,
         'alerts': alerts[:10],  # Limit to 10 alerts
     }
@@ -407,19 +481,21 @@ def dashboard(request):
     return render(request, 'dashboard.html', context)
 
 @login_required
+@cache_control(private=True, max_age=0)
+@cache_until_stock_changes(60)
+@vary_on_cookie
 def analytics_data(request):
     """Provide JSON data for analytics charts"""
-    from datetime import timedelta
-    
     # Get date range (last 30 days by default)
     end_date = timezone.now().date()
     start_date = end_date - timedelta(days=30)
     
-    # Daily dispense data
+    # Daily dispense data; __date compares in the current time zone, like
+    # TruncDate, so today's dispenses are included
     daily_dispenses = DispenseHistory.objects.filter(
-        date__range=[start_date, end_date]
-    ).extra(
-        select={'day': "date(date)"}
+        date__date__range=[start_date, end_date]
+    ).annotate(
+        day=TruncDate('date')
     ).values('day').annotate(
         total=Sum('quantity_out')
     ).order_by('day')
@@ -429,18 +505,16 @@ def analytics_data(request):
         count=Count('id')
     ).order_by('-count')
     
-    # Expiry distribution
-    today = timezone.now().date()
-    expiry_data = {
-        'expired': MedicineInventory.objects.filter(expiry_date__lte=today).count(),
-        'expiring_soon': MedicineInventory.objects.filter(
+    # Expiry distribution in a single pass
+    today = end_date
+    expiry_data = MedicineInventory.objects.aggregate(
+        expired=Count('id', filter=Q(expiry_date__lte=today)),
+        expiring_soon=Count('id', filter=Q(
             expiry_date__gt=today,
             expiry_date__lte=today + timedelta(days=30)
-        ).count(),
-        'good': MedicineInventory.objects.filter(
-            expiry_date__gt=today + timedelta(days=30)
-        ).count(),
-    }
+        )),
+        good=Count('id', filter=Q(expiry_date__gt=today + timedelta(days=30))),
+    )
     
     data = {
         'daily_dispenses': list(daily_dispenses),
@@ -490,72 +564,82 @@ def generate_reports(request):
         messages.error(request, 'Invalid report type.')
         return redirect('dashboard')
 
+class Echo:
+    """File-like object whose write() returns the line, for streaming csv.writer output"""
+    def write(self, value):
+        return value
+
+def stream_csv(filename, header, rows):
+    """Return a StreamingHttpResponse that writes header and then each row lazily"""
+    writer = csv.writer(Echo())
+
+    def lines():
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    return StreamingHttpResponse(
+        lines(),
+        content_type='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
 @login_required
 def export_expiry_report(request):
     """Export expiry report to CSV"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="expiry_report.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'Medicine Name', 'Batch No', 'Expiry Date', 'Days to Expiry', 'Status', 'Balance'
-    ])
-    
-    items = MedicineInventory.objects.all().order_by('expiry_date')
-    
-    for item in items:
-        status = 'Expired' if item.is_expired else 'Expiring Soon' if item.days_to_expiry <= 30 else 'Good'
-        writer.writerow([
-            item.medicine_name, item.batch_no, item.expiry_date,
-            item.days_to_expiry, status, item.balance()
-        ])
-    
-    return response
+    header = ['Medicine Name', 'Batch No', 'Expiry Date', 'Days to Expiry', 'Status', 'Balance']
+    
+    def rows():
+        # Balance, expiry flag and days to expiry come from with_status() annotations
+        items = MedicineInventory.objects.with_status().order_by('expiry_date')
+        for item in items.iterator(chunk_size=2000):
+            days_to_expiry = item.days_until_expiry.days
+            status = 'Expired' if item.expired else 'Expiring Soon' if days_to_expiry <= 30 else 'Good'
+            yield [
+                item.medicine_name, item.batch_no, item.expiry_date,
+                days_to_expiry, status, item.current_balance
+            ]
+    
+    return stream_csv('expiry_report.csv', header, rows())
 
 @login_required
 def export_dispense_report(request):
     """Export dispense history to CSV"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="dispense_report.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
+    header = [
         'Date', 'Medicine Name', 'Batch No', 'Patient Name', 'Quantity',
         'Dispensed By', 'Prescribing Doctor'
-    ])
-    
-    history = DispenseHistory.objects.all().order_by('-date')
-    
-    for record in history:
-        writer.writerow([
-            record.date.strftime('%Y-%m-%d %H:%M'),
-            record.medicine_name, record.batch_no, record.dispensed_to,
-            record.quantity_out, record.dispensed_by.username if record.dispensed_by else '',
-            record.prescribing_doctor
-        ])
-    
-    return response
+    ]
+    
+    def rows():
+        history = DispenseHistory.objects.select_related('dispensed_by').order_by('-date')
+        for record in history.iterator(chunk_size=2000):
+            yield [
+                record.date.strftime('%Y-%m-%d %H:%M'),
+                record.medicine_name, record.batch_no, record.dispensed_to,
+                record.quantity_out, record.dispensed_by.username if record.dispensed_by else '',
+                record.prescribing_doctor
+            ]
+    
+    return stream_csv('dispense_report.csv', header, rows())
 
 @login_required
 def export_inventory_csv(request):
     """Export inventory to CSV"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="inventory_export.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
+    header = [
         'Medicine Name', 'Generic Name', 'Dosage Form', 'Strength', 'Batch No',
         'Expiry Date', 'Quantity In', 'Quantity Out', 'Balance', 'Supplier',
         'Storage Condition', 'Unit Cost', 'Created By', 'Date Added'
-    ])
-    
-    for item in MedicineInventory.objects.all():
-        writer.writerow([
-            item.medicine_name, item.generic_name, item.dosage_form, item.strength,
-            item.batch_no, item.expiry_date, item.quantity_in, item.quantity_out,
-            item.balance(), item.supplier_name, item.storage_condition,
-            item.unit_cost, item.created_by.username if item.created_by else '',
-            item.date
-        ])
-    
-    return response
\ No newline at end of file
+    ]
+    
+    def rows():
+        items = MedicineInventory.objects.select_related('created_by').with_balance()
+        for item in items.iterator(chunk_size=2000):
+            yield [
+                item.medicine_name, item.generic_name, item.dosage_form, item.strength,
+                item.batch_no, item.expiry_date, item.quantity_in, item.quantity_out,
+                item.current_balance, item.supplier_name, item.storage_condition,
+                item.unit_cost, item.created_by.username if item.created_by else '',
+                item.date
+            ]
+    
+    return stream_csv('inventory_export.csv', header, rows())
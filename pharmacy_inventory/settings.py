@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -78,6 +79,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # SQLite ignores SELECT ... FOR UPDATE; taking the write lock when
+            # atomic() begins serialises concurrent dispenses of a batch instead
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
@@ -231,3 +237,6 @@ BACKUP_DIRECTORY = os.environ.get('BACKUP_DIRECTORY', BASE_DIR / 'backups')
 # Low Stock Alert Threshold (days before sending alerts)
 LOW_STOCK_ALERT_DAYS = int(os.environ.get('LOW_STOCK_ALERT_DAYS', '7'))
 EXPIRY_ALERT_DAYS = int(os.environ.get('EXPIRY_ALERT_DAYS', '30'))
+
+# Number of rows buffered per bulk insert in the import commands
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '500'))
@@ -1,7 +1,11 @@
 """
 Production settings for Pharmacy Inventory Tracker
 """
+import logging
 import os
+import queue
+from logging.handlers import QueueListener, WatchedFileHandler
+
 from .settings import *
 
 # Override settings for production
@@ -21,6 +25,19 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Run on every new connection: WAL lets readers proceed during writes
+        'OPTIONS': {
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA cache_size=-64000;'
+                'PRAGMA mmap_size=268435456;'
+                'PRAGMA temp_store=MEMORY;'
+            ),
+            'timeout': 20,
+            # Write lock at BEGIN, so select_for_update()'s intent holds on SQLite
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
@@ -36,6 +53,18 @@ DATABASES = {
 #     }
 # }
 
+# Cached dashboard/analytics pages and list counts are invalidated by bumping a
+# version key in the default cache. That only reaches every WSGI process if the
+# cache is shared; the default LocMemCache is per process, which is fine for the
+# single-process mod_wsgi daemon and gunicorn setups shipped here. With several
+# processes, configure a shared cache, e.g.:
+# CACHES = {
+#     'default': {
+#         'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#         'LOCATION': os.path.join(BASE_DIR, 'cache'),
+#     }
+# }
+
 # Security settings for production
 SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
@@ -78,6 +107,11 @@ EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
 LOGS_DIR = os.path.join(BASE_DIR, 'logs')
 os.makedirs(LOGS_DIR, exist_ok=True)
 
+# Log records are queued by the logging thread and written to disk by a
+# background QueueListener (started in InventoryConfig.ready(), so every
+# entry point drains the queue); WatchedFileHandler reopens the file after logrotate.
+LOG_QUEUE = queue.Queue(-1)
+
 # Logging configuration for production
 LOGGING = {
     'version': 1,
@@ -93,11 +127,10 @@ LOGGING = {
         },
     },
     'handlers': {
-        'file': {
+        'queue': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': os.path.join(LOGS_DIR, 'pharmacy.log'),
-            'formatter': 'verbose',
+            'class': 'logging.handlers.QueueHandler',
+            'queue': LOG_QUEUE,
         },
         'console': {
             'level': 'INFO',
@@ -123,18 +156,14 @@ LOGGING = {
     },
 }
 
-# Try to add file logging if possible
-try:
-    # Test if we can write to the log file
-    log_file_path = os.path.join(LOGS_DIR, 'pharmacy.log')
-    with open(log_file_path, 'a') as f:
-        f.write('')  # Test write
-    
-    # If successful, add file handlers
-    LOGGING['handlers']['file']['filename'] = log_file_path
-    LOGGING['root']['handlers'] = ['file', 'console']
-    LOGGING['loggers']['django']['handlers'] = ['file', 'console']
-    LOGGING['loggers']['inventory']['handlers'] = ['file', 'console']
-except (PermissionError, FileNotFoundError):
-    # If file logging fails, just use console
-    pass
\ No newline at end of file
+verbose_format = LOGGING['formatters']['verbose']
+LOG_FILE_HANDLER = WatchedFileHandler(os.path.join(LOGS_DIR, 'pharmacy.log'), delay=True)
+LOG_FILE_HANDLER.setLevel(logging.INFO)
+LOG_FILE_HANDLER.setFormatter(logging.Formatter(verbose_format['format'], style=verbose_format['style']))
+LOG_LISTENER = QueueListener(LOG_QUEUE, LOG_FILE_HANDLER, respect_handler_level=True)
+
+# Add file logging if the logs directory is writable; the file itself is opened lazily
+if os.access(LOGS_DIR, os.W_OK):
+    LOGGING['root']['handlers'] = ['queue', 'console']
+    LOGGING['loggers']['django']['handlers'] = ['queue', 'console']
+    LOGGING['loggers']['inventory']['handlers'] = ['queue', 'console']
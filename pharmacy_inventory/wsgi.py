@@ -10,7 +10,15 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 import os
 
 from django.core.wsgi import get_wsgi_application
+from django.template.loader import get_template
+from django.urls import get_resolver
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pharmacy_inventory.settings')
 
 application = get_wsgi_application()
+
+# Warm the worker before its first request: resolving the URLconf imports the
+# views, forms and models, and get_template fills the cached template loader
+get_resolver().url_patterns
+for template_name in ('base.html', 'dashboard.html', 'inventory_list.html', 'dispense_history.html'):
+    get_template(template_name)
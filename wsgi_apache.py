@@ -6,7 +6,6 @@ This module contains the WSGI application used by Apache server.
 
 import os
 import sys
-from django.core.wsgi import get_wsgi_application
 
 # Add the project path to Python path
 project_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -16,8 +15,9 @@ if project_path not in sys.path:
 # Set the default Django settings module
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pharmacy_inventory.settings')
 
-# Get the Django WSGI application
-application = get_wsgi_application()
+# Get the Django WSGI application; pharmacy_inventory.wsgi also warms the
+# URLconf and hot templates so the first request doesn't pay for them
+from pharmacy_inventory.wsgi import application
 
 # For Apache mod_wsgi, we can add additional configuration here if needed
 # For example, environment variables, logging setup, etc.
\ No newline at end of file